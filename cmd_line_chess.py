@@ -1,9 +1,22 @@
 #!/usr/bin/python3
 
-import copy
+import array
+import collections
+import concurrent.futures
+import inspect
 import itertools
+import json
+import marshal
+import mmap
+import random
 import re
 import os
+import struct
+import sys
+import textwrap
+import threading
+import time
+import tracemalloc
 
 instructions = '''
 -------------------------------------
@@ -41,6 +54,8 @@ Piece codes: K = king   Q = queen   R = rook   B = bishop   N = knight
 
 color_dict = {'*': {'color': 'white', 'back_rank': 1, 'direction': 1}, '-': {'color': 'black', 'back_rank': 8, 'direction': -1}}
 
+position_core = 'attack_maps'       # 'attack_maps' or 'bitboards'; with 'bitboards', arrange_board also keeps bitboards, which then answer legal_moves_func and check
+
 #------------------- basic functions
     
 # returns opposite color of current player
@@ -57,6 +72,30 @@ def relative_dir(a, b):             #relative direction of a from b: 1, -1, or 0
         direction = 0
     return direction
 
+# converts square name to index used by move calculation functions (a1 = 0, b1 = 1 ... h8 = 63)
+def square_index(square):
+    return (int(square[1]) - 1) * 8 + ord(square[0]) - 97
+
+def square_name(index):
+    return chr(index % 8 + 97) + str(index // 8 + 1)
+
+def board_placement(board):     # piece placement on board in FEN notation, rank 8 first (e.g. rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR)
+    ranks = []
+    for rank_start in range(56, -8, -8):
+        rank = ''
+        empty_squares = 0
+        for contents in board[rank_start:rank_start + 8]:
+            if contents == '   ':
+                empty_squares += 1
+                continue
+            if empty_squares > 0: rank += str(empty_squares)
+            empty_squares = 0
+            letter = 'P' if contents[1] == 'i' else contents[1]
+            rank += letter if contents[0] == '*' else letter.lower()
+        if empty_squares > 0: rank += str(empty_squares)
+        ranks.append(rank)
+    return '/'.join(ranks)
+
 def iter_tree(target, index_filters: dict = {}, dim_limit: int = 0, parent_keys: list = []):
     if type(target) == dict:
         branch_indexes = target.keys()
@@ -75,53 +114,44 @@ def iter_tree(target, index_filters: dict = {}, dim_limit: int = 0, parent_keys:
         for branch in branch_indexes:
             yield from iter_tree(target[branch], index_filters, dim_limit, parent_keys + [branch])
 
-# assembles, aligns, and displays board and marks previous move; calls: opposite_color
-def display_board(board, color_code, move_log):   #displays command-prompt board
-    if len(move_log[opposite_color(color_code)]) > 0:                               # locate starting and ending squares of previous move in order to mark them
-        v_mark_a = int(move_log[opposite_color(color_code)][-1]['start_square'][1])
-        h_mark_a = ord(move_log[opposite_color(color_code)][-1]['start_square'][0])
-        v_mark_b = int(move_log[opposite_color(color_code)][-1]['move_square'][1])
-        h_mark_b = ord(move_log[opposite_color(color_code)][-1]['move_square'][0])
-    else:                                                                           # disable previous-move marks at beginning of game
-        v_mark_a = 0
-        h_mark_a = 0
-        v_mark_b = 0
-        h_mark_b = 0
-        
-    s = 55                              #identation of chess board
-    
-    column_labels = ''
-    for c in range(8):                  
-        column_labels += '' + chr(c + 97) + '   '   # a - h
-    rows = ''
-    for r in range(9):
-        row_divider = ''
-        for c in range(8):                                  # construct_row_dividers
-            if      ((v_mark_a in range(8 - r, 10 - r) and       
-                     h_mark_a == c + 97) or
-                    (v_mark_b in range(8 - r, 10 -r) and
-                     h_mark_b == c + 97)):
-                row_divider += '+-+-'                       # divider with previous-move mark
+# command-prompt board display that keeps the lines of the last frame and rebuilds only lines whose squares or previous-move marks have changed
+class BoardRenderer:
+    indent = 55         # width lines of board are right-aligned to
+    column_labels = ''.join(chr(column + 97) + '   ' for column in range(8)).rjust(indent)      # a - h
+
+    def __init__(self):
+        self.line_keys = [None] * 17        # squares and marks each line was built from: 9 row dividers and 8 rows, from top of board
+        self.lines = [None] * 17
+
+    def frame(self, board, marked_squares):        # text of board, with start and move squares of previous move marked
+        marked_columns = {}         # {row: {columns, of, marked, squares}}
+        for square in marked_squares:
+            marked_columns.setdefault(square // 8, set()).add(square % 8)
+        for line_number in range(17):
+            row = 7 - line_number // 2       # row of line, or row below divider
+            if line_number % 2 == 0:        # divider between row and row above it
+                columns = marked_columns.get(row, set()) | marked_columns.get(row + 1, set())
+                key = frozenset(columns)
+                if key != self.line_keys[line_number]:
+                    line = ''.join('+-+-' if column in columns else '+---' for column in range(8)) + '+'      # divider with previous-move mark, or ordinary divider
             else:
-                row_divider += '+---'                       # ordinary divider               
-        row_divider += '+'
-        rows += row_divider.rjust(s) + '\n'
-        if r < 8:                                           # no 9th row, only divider
-            row_spaces = str(8 - r) + ' '
-            for c in range(9):                              # add column dividers and spaces to rows
-                if      ((v_mark_a == 8 - r and
-                         h_mark_a in range(c + 96, c + 98)) or
-                        (v_mark_b == 8 - r and
-                         h_mark_b in range(c + 96, c + 98))):
-                    row_spaces += '+'                       # divider with previous-move mark
-                else:
-                    row_spaces += '|'                       # ordinary divider
-                if c < 8:                                   # no 9th space, only divider
-                    row_spaces += board[chr(c + 97) + str (8 - r)]  # contents of each space
-            rows += row_spaces.rjust(s) + '\n'
-    display_board = column_labels.rjust(s) + '\n' + rows
-    print('\n', display_board)
-
+                columns = marked_columns.get(row, set())
+                key = (tuple(board[row * 8:row * 8 + 8]), frozenset(columns))
+                if key != self.line_keys[line_number]:
+                    line = str(row + 1) + ' '
+                    for column in range(9):         # column dividers, marked on either side of marked square, and contents of squares
+                        line += '+' if column in columns or column - 1 in columns else '|'
+                        if column < 8: line += board[row * 8 + column]
+            if key != self.line_keys[line_number]:
+                self.line_keys[line_number] = key
+                self.lines[line_number] = line.rjust(BoardRenderer.indent) + '\n'
+        return BoardRenderer.column_labels + '\n' + ''.join(self.lines)
+
+    def display(self, board, color_code, move_log):     # writes board, with last move of other color marked, in one call; calls: frame
+        previous_moves = move_log[opposite_color(color_code)]
+        marked_squares = () if previous_moves == [] else (previous_moves[-1].start_square, previous_moves[-1].move_square)
+        sys.stdout.write('\n ' + self.frame(board, marked_squares) + '\n')
+        sys.stdout.flush()
 
 
 #--------------- move calculation functions
@@ -146,10 +176,11 @@ class Piece:
         if blocked_square == False:
             return True
     
-    def __init__(self, name, vectors, reach):
+    def __init__(self, name, vectors, reach, value):
         self.name = name
         self.vectors = vectors
         self.reach = reach
+        self.value = value          # material value in centipawns, used by computer player
 
     def get_vectors(self, direction):
         if self.name == 'pawn' and direction == -1:
@@ -158,203 +189,592 @@ class Piece:
             return self.vectors
 
 #instantiate Piece objects for use in piece_scope()
-king = Piece('king', king_queen_vectors, 'short_reach')                 
-queen = Piece('queen', king_queen_vectors, 'long_reach')
-rook = Piece('rook', rook_vectors, 'long_reach')
-bishop = Piece('bishop', bishop_vectors, 'long_reach')
-knight = Piece('knight', knight_vectors, 'short_reach')
-pawn = Piece('pawn', pawn_vectors, 'short_reach')
+king = Piece('king', king_queen_vectors, 'short_reach', 0)                 
+queen = Piece('queen', king_queen_vectors, 'long_reach', 900)
+rook = Piece('rook', rook_vectors, 'long_reach', 500)
+bishop = Piece('bishop', bishop_vectors, 'long_reach', 330)
+knight = Piece('knight', knight_vectors, 'short_reach', 320)
+pawn = Piece('pawn', pawn_vectors, 'short_reach', 100)
 
 piece_family_dict = {'K': king, 'Q': queen, 'R': rook, 'B': bishop, 'N': knight, 'i': pawn}     #keys piece code to piece class object
 
-def evaluate_squares(h, v, column, row, piece, reach_type, board, square_list):
-    distance = 1
-    blocked_square = False
-    while (0 < column + h * distance < 9 and
-           0 < row + v * distance < 9 and
-           getattr(piece_family_dict[piece], reach_type)(distance, blocked_square) == True):
-        square = chr(column + 96 + h * distance) + str(row + v * distance)
+#board contents for each piece, e.g. piece_symbols['*']['R'] = '*R*'; built once so board squares and the moved_pieces and deleted_pieces dictionaries share the same strings
+piece_symbols = {color_code: {piece_code: color_code + piece_code + color_code for piece_code in piece_family_dict} for color_code in color_dict}
+
+class Move:         # record of a move in move_log; __slots__ keeps records small and quick to create
+
+    __slots__ = ('piece_code', 'specifier', 'promotion', 'castling_rook', 'start_square', 'move_square',
+                 'capture_square_contents', 'en_passant_capture', 'previous_state', 'notation')
+
+    def __init__(self, piece_code, start_square, move_square, capture_square_contents, specifier='', promotion=None, castling_rook=None):
+        self.piece_code = piece_code                            # 'K', 'Q', 'R', 'B', 'N', 'i' (pawn) or 'O' (castling)
+        self.specifier = specifier                              # notation that distinguishes piece from others that can make the move
+        self.promotion = promotion                              # piece code of pawn promotion
+        self.castling_rook = castling_rook                      # home square of rook when castling
+        self.start_square = start_square
+        self.move_square = move_square
+        self.capture_square_contents = capture_square_contents  # board contents of move square before move
+        self.en_passant_capture = None                          # square of pawn captured en passant; set by move_piece
+        self.previous_state = None                              # castling privileges, en passant square and halfmove clock before move; set by move_piece
+        self.notation = None                                    # notation of move as shown in move log; set by play_move
+
+def piece_rays(piece, direction):       # rays of squares reachable by piece from each square on an empty board, in order of distance
+    reach = getattr(piece, piece.reach)
+    rays = []
+    for square in range(64):
+        square_rays = []
+        for h, v in piece.get_vectors(direction):     #loops all pairs of horizontol and vertical vectors of piece object
+            ray = []
+            column = square % 8 + h
+            row = square // 8 + v
+            while 0 <= column < 8 and 0 <= row < 8 and reach(len(ray) + 1, False) == True:
+                ray.append(row * 8 + column)
+                column += h
+                row += v
+            if ray != []: square_rays.append(tuple(ray))
+        rays.append(square_rays)
+    return rays
+
+#ray tables built once: ray_dict[color_code][piece_code][square] = [rays]
+shared_rays = {piece_code: piece_rays(piece_family_dict[piece_code], 1) for piece_code in piece_family_dict if piece_code != 'i'}
+ray_dict = {color_code: dict(shared_rays, i=piece_rays(pawn, color_dict[color_code]['direction'])) for color_code in color_dict}
+
+# attacks along line through each square in direction of vector and opposite direction, for every occupancy of line
+# table[square] = (mask, {occupancy & mask: ([squares, attacked], bits of attacked squares)}); mask holds squares that can block, leaving out square itself and board edges
+def line_attack_table(h, v):
+    table = []
+    for square in range(64):
+        rays = []
+        for step_h, step_v in ((h, v), (-h, -v)):
+            ray = []
+            column = square % 8 + step_h
+            row = square // 8 + step_v
+            while 0 <= column < 8 and 0 <= row < 8:
+                ray.append(row * 8 + column)
+                column += step_h
+                row += step_v
+            rays.append(ray)
+        mask = 0
+        for ray in rays:
+            for blocker in ray[:-1]:
+                mask |= 1 << blocker
+        attacks = {}
+        occupancy = 0
+        while True:                 # every subset of mask, counted upward through its bits
+            squares = []
+            bits = 0
+            for ray in rays:
+                for attacked_square in ray:         # squares up to and including first occupied square
+                    squares.append(attacked_square)
+                    bits |= 1 << attacked_square
+                    if occupancy >> attacked_square & 1: break
+            attacks[occupancy] = (squares, bits)
+            occupancy = (occupancy - mask) & mask
+            if occupancy == 0: break
+        table.append((mask, attacks))
+    return table
+
+# tables of lines of rank, file, diagonal and antidiagonal; read from cache_path if it holds tables written by an earlier session, else built and written there
+def slider_line_tables(cache_path=None):
+    if cache_path != None and os.path.isfile(cache_path):
+        try:
+            cache_file = open(cache_path, 'rb')
+            tables = marshal.loads(cache_file.read())
+            cache_file.close()
+            if type(tables) == list and len(tables) == 4 and all(len(table) == 64 for table in tables):
+                return tables
+        except (OSError, EOFError, ValueError, TypeError):       # unreadable cache is rebuilt
+            pass
+    tables = [line_attack_table(h, v) for h, v in ((1, 0), (0, 1), (1, 1), (1, -1))]
+    if cache_path != None:
+        try:
+            cache_file = open(cache_path + '.tmp', 'wb')
+            marshal.dump(tables, cache_file)
+            cache_file.close()
+            os.replace(cache_path + '.tmp', cache_path)     # other sessions never read a partly written cache
+        except OSError:
+            pass
+    return tables
+
+#slider attack tables built once, or read from file named by CHESS_TABLE_CACHE environment variable: slider_lines[piece_code] = [line tables of piece]
+rank_table, file_table, diagonal_table, antidiagonal_table = slider_line_tables(os.environ.get('CHESS_TABLE_CACHE'))
+slider_lines = {'Q': [rank_table, file_table, diagonal_table, antidiagonal_table], 'R': [rank_table, file_table], 'B': [diagonal_table, antidiagonal_table]}
+
+def slider_scope(piece_code, square, occupancy):        # squares attacked by queen, rook or bishop on square: each ray up to and including first occupied square
+    scope = []
+    for mask, attacks in (table[square] for table in slider_lines[piece_code]):
+        scope += attacks[occupancy & mask][0]
+    return scope
+
+#zobrist keys: random 64-bit numbers combined with XOR to identify positions; seeded so keys are the same in every session
+zobrist_random = random.Random(0)
+zobrist_pieces = {color: {piece_code: [zobrist_random.getrandbits(64) for square in range(64)] for piece_code in piece_family_dict} for color in color_dict}
+zobrist_side = zobrist_random.getrandbits(64)        # included when black is to move
+zobrist_castling = {rook_home: zobrist_random.getrandbits(64) for rook_home in (0, 7, 56, 63)}     # home squares of rooks with castling privileges
+zobrist_en_passant = [zobrist_random.getrandbits(64) for column in range(8)]
+
+#piece-square tables in centipawns, from white's side of board (a8 first, h1 last); black's are mirrored
+piece_square_tables = {
+    'i': [  0,  0,  0,  0,  0,  0,  0,  0,
+           50, 50, 50, 50, 50, 50, 50, 50,
+           10, 10, 20, 30, 30, 20, 10, 10,
+            5,  5, 10, 25, 25, 10,  5,  5,
+            0,  0,  0, 20, 20,  0,  0,  0,
+            5, -5,-10,  0,  0,-10, -5,  5,
+            5, 10, 10,-20,-20, 10, 10,  5,
+            0,  0,  0,  0,  0,  0,  0,  0],
+    'N': [-50,-40,-30,-30,-30,-30,-40,-50,
+          -40,-20,  0,  0,  0,  0,-20,-40,
+          -30,  0, 10, 15, 15, 10,  0,-30,
+          -30,  5, 15, 20, 20, 15,  5,-30,
+          -30,  0, 15, 20, 20, 15,  0,-30,
+          -30,  5, 10, 15, 15, 10,  5,-30,
+          -40,-20,  0,  5,  5,  0,-20,-40,
+          -50,-40,-30,-30,-30,-30,-40,-50],
+    'B': [-20,-10,-10,-10,-10,-10,-10,-20,
+          -10,  0,  0,  0,  0,  0,  0,-10,
+          -10,  0,  5, 10, 10,  5,  0,-10,
+          -10,  5,  5, 10, 10,  5,  5,-10,
+          -10,  0, 10, 10, 10, 10,  0,-10,
+          -10, 10, 10, 10, 10, 10, 10,-10,
+          -10,  5,  0,  0,  0,  0,  5,-10,
+          -20,-10,-10,-10,-10,-10,-10,-20],
+    'R': [  0,  0,  0,  0,  0,  0,  0,  0,
+            5, 10, 10, 10, 10, 10, 10,  5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+            0,  0,  0,  5,  5,  0,  0,  0],
+    'Q': [-20,-10,-10, -5, -5,-10,-10,-20,
+          -10,  0,  0,  0,  0,  0,  0,-10,
+          -10,  0,  5,  5,  5,  5,  0,-10,
+           -5,  0,  5,  5,  5,  5,  0, -5,
+            0,  0,  5,  5,  5,  5,  0, -5,
+          -10,  5,  5,  5,  5,  5,  0,-10,
+          -10,  0,  5,  0,  0,  0,  0,-10,
+          -20,-10,-10, -5, -5,-10,-10,-20],
+    'K': [-30,-40,-40,-50,-50,-40,-40,-30,
+          -30,-40,-40,-50,-50,-40,-40,-30,
+          -30,-40,-40,-50,-50,-40,-40,-30,
+          -30,-40,-40,-50,-50,-40,-40,-30,
+          -20,-30,-30,-40,-40,-30,-30,-20,
+          -10,-20,-20,-20,-20,-20,-20,-10,
+           20, 20,  0,  0,  0,  0, 20, 20,
+           20, 30, 10,  0,  0, 10, 30, 20]}
+
+#material plus piece-square value of each piece on each square, positive for white and negative for black, e.g. piece_square_values['-']['N'][62] = -320 - -40
+piece_square_values = {'*': {piece_code: [piece_family_dict[piece_code].value + piece_square_tables[piece_code][(7 - square // 8) * 8 + square % 8] for square in range(64)] for piece_code in piece_family_dict},
+                       '-': {piece_code: [-piece_family_dict[piece_code].value - piece_square_tables[piece_code][square] for square in range(64)] for piece_code in piece_family_dict}}
+
+def evaluation_score(current_position):     # calculates score of position for white from scratch; update_position updates it incrementally
+    score = 0
+    for color in color_dict:
+        for piece_code, locations in current_position[color].items():
+            for square in locations:
+                score += piece_square_values[color][piece_code][square]
+    return score
+
+def evaluate(current_position, color_code):     # material and piece-square score of position for color, in centipawns
+    if color_code == '*': return current_position['score']
+    return -current_position['score']
+
+def zobrist_key(current_position, color_code):      # calculates zobrist key of position from scratch; move_piece and undo_move update it incrementally
+    key = 0
+    for color in color_dict:
+        for piece_code, locations in current_position[color].items():
+            for square in locations:
+                key ^= zobrist_pieces[color][piece_code][square]
+    for rook_home in current_position['castling']:
+        key ^= zobrist_castling[rook_home]
+    if current_position['en_passant'] != None:
+        key ^= zobrist_en_passant[current_position['en_passant'] % 8]
+    if color_code == '-':
+        key ^= zobrist_side
+    return key
+
+def evaluate_squares(ray, board, square_list):      # adds squares of ray up to and including first occupied square
+    for square in ray:
         square_list.append(square)
-        distance += 1
         if board[square] != '   ':
-            blocked_square = True
+            break
 
-def add_pieces(moved_pieces, position, board):
+def add_pieces(moved_pieces, position, board):      # position['occupancy'] must already include moved pieces
     for square in moved_pieces:
-        column = ord(square[0]) - 96
-        row = int(square[1])
         piece = moved_pieces[square]
-        color = piece['color_code']
-        piece_code = piece['piece_code']
+        color = piece[0]
+        piece_code = piece[1]
         position[color].setdefault(piece_code, {})
-        position[color][piece_code][square] = []
+        if piece_code in slider_lines:          # queen, rook and bishop scopes are looked up
+            position[color][piece_code][square] = slider_scope(piece_code, square, position['occupancy'])
+            continue
         new_squares_controlled = []
-        reach_type = piece_family_dict[piece_code].reach        #piece_family_dict identifies appropriate piece object
-        for h, v in piece_family_dict[piece_code].get_vectors(color_dict[color]['direction']):     #loops all pairs of horizontol and vertical vectors of piece object
-            evaluate_squares(h, v, column, row, piece_code, reach_type, board, new_squares_controlled)
+        for ray in ray_dict[color][piece_code][square]:         #loops all rays of piece from square
+            evaluate_squares(ray, board, new_squares_controlled)
         position[color][piece_code][square] = new_squares_controlled     #add squares_controlled to new_position dictionary
 
 def delete_pieces(deleted_pieces, position):
     removal_list = []
     for square in deleted_pieces:
         piece = deleted_pieces[square]
-        del position[piece['color_code']][piece['piece_code']][square]
-        removal_list.append((piece['color_code'], piece['piece_code']))
+        del position[piece[0]][piece[1]][square]
+        removal_list.append((piece[0], piece[1]))
     for color, piece in removal_list:
         if position[color][piece] == {}:
             del position[color][piece]
 
 # sets initial arragement of pieces on board and populates initial position dictionary
 def arrange_board():                                        
-    board = {}
-    for c, r in itertools.product(range(97, 105), range(1, 9)):     #creates dictionary for empty chess board   97-104 = chr values of column letters
-        board[chr(c) + str(r)] = '   '
+    board = ['   '] * 64                                         #creates list for empty chess board, indexed a1 = 0 ... h8 = 63
     piece_positions = {}
     starting_pieces = ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R']
     for color_code in color_dict:                                         #arranges pieces and pawn in starting position
-        for col_num in range(97, 105):                                    #97-104 = chr values of column letters
-            piece_code = starting_pieces[col_num - 97]
-            piece_square = chr(col_num) + str(color_dict[color_code]['back_rank'])      #column_letter + back_rank
-            pawn_square = piece_square[0] + str(color_dict[color_code]['back_rank'] + color_dict[color_code]['direction'])  #column_letter + back_rank+1
-            board[piece_square] = color_code + piece_code + color_code     #color_code + <piece_code from list (corresponding to columns)> + color_code
-            board[pawn_square] = color_code + 'i' + color_code
-            piece_positions[piece_square] = {'color_code': color_code, 'piece_code': piece_code}
-            piece_positions[pawn_square] = {'color_code': color_code, 'piece_code': 'i'}
-    position = {'*': {}, '-': {}}
-    add_pieces(piece_positions, position, board)
+        for column in range(8):
+            piece_code = starting_pieces[column]
+            piece_square = (color_dict[color_code]['back_rank'] - 1) * 8 + column      #column + back_rank
+            pawn_square = piece_square + color_dict[color_code]['direction'] * 8         #column + back_rank+1
+            board[piece_square] = piece_symbols[color_code][piece_code]     #color_code + <piece_code from list (corresponding to columns)> + color_code
+            board[pawn_square] = piece_symbols[color_code]['i']
+            piece_positions[piece_square] = piece_symbols[color_code][piece_code]
+            piece_positions[pawn_square] = piece_symbols[color_code]['i']
+    position = set_up_position(board, piece_positions, '*', frozenset(zobrist_castling), None)
     return board, position
 
-def update_position(board, color_code, move_record, moved_pieces, deleted_pieces, current_position, new_position):
+# populates position dictionary for pieces placed on board; calls: add_pieces, zobrist_key, update_bitboards
+def set_up_position(board, piece_positions, color_code, castling, en_passant, halfmove_clock=0):
+    position = {'*': {}, '-': {}, 'turn': color_code, 'castling': castling, 'en_passant': en_passant}      #turn: color to move; castling: rook home squares that keep castling privileges; en_passant: square behind pawn that can be captured en passant
+    position['halfmove_clock'] = halfmove_clock     # moves since last capture or pawn move
+    position['occupancy'] = 0           # bits of occupied squares, used to look up slider scopes
+    for square in piece_positions:
+        position['occupancy'] |= 1 << square
+    add_pieces(piece_positions, position, board)
+    seen_by = [set() for square in range(64)]
+    for color in color_dict:
+        for piece_code in slider_lines:
+            for location, scope in position[color].get(piece_code, {}).items():
+                for square in scope:
+                    seen_by[square].add(location)
+    position['seen_by'] = [frozenset(locations) for locations in seen_by]     # [locations of queens, rooks and bishops with square in scope] for each square
+    position['zobrist'] = zobrist_key(position, color_code)
+    position['repetitions'] = {position['zobrist']: 1}      # {zobrist key: times position has occurred}; the one dictionary is updated in place by move_piece and undo_move
+    position['score'] = evaluation_score(position)
+    if position_core == 'bitboards':
+        position['bitboards'] = {color: {piece_code: 0 for piece_code in piece_family_dict} for color in color_dict}
+        update_bitboards(piece_positions, {}, position['bitboards'])
+    return position
+
+starting_fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# sets up board and position described by FEN directly, without playing moves: returns (board, position, fullmove number); halfmove clock is kept in position
+# castling privileges without king and rook on their home squares, and en passant squares where no pawn can capture, are dropped
+# raises ValueError if FEN is not valid, has pawns on first or last rank, or has side not to move in check; calls: set_up_position, check
+def fen_position(fen):
+    fields = fen.split()
+    if len(fields) == 4: fields += ['0', '1']        # move counters are optional
+    if (len(fields) != 6 or len(fields[0].split('/')) != 8 or fields[1] not in ('w', 'b') or
+            re.search(r'^(-|K?Q?k?q?)$', fields[2]) == None or re.search(r'^(-|[a-h][36])$', fields[3]) == None or
+            not fields[4].isdigit() or not fields[5].isdigit()):
+        raise ValueError('not a valid FEN: ' + fen)
+    board = ['   '] * 64
+    piece_positions = {}
+    for rank_number, rank in enumerate(fields[0].split('/')):
+        square = (7 - rank_number) * 8          # rank 8 comes first
+        rank_end = square + 8
+        for letter in rank:
+            if letter in '12345678':            # empty squares
+                square += int(letter)
+                continue
+            piece_code = 'i' if letter in 'Pp' else letter.upper()
+            if piece_code not in piece_family_dict or letter == 'I' or square >= rank_end:
+                raise ValueError('not a valid FEN: ' + fen)
+            if piece_code == 'i' and rank_number in (0, 7):
+                raise ValueError('FEN has pawn on first or last rank: ' + fen)
+            color_code = '*' if letter.isupper() else '-'
+            board[square] = piece_symbols[color_code][piece_code]
+            piece_positions[square] = piece_symbols[color_code][piece_code]
+            square += 1
+        if square != rank_end:
+            raise ValueError('not a valid FEN: ' + fen)
+    if [board.count(piece_symbols[color_code]['K']) for color_code in color_dict] != [1, 1]:
+        raise ValueError('FEN must have one king of each color: ' + fen)
+    color_code = '*' if fields[1] == 'w' else '-'
+    castling = set()
+    for letter in fields[2].strip('-'):
+        castling_color = '*' if letter.isupper() else '-'
+        back_rank_start = (color_dict[castling_color]['back_rank'] - 1) * 8
+        rook_home = back_rank_start + (7 if letter in 'Kk' else 0)
+        if board[back_rank_start + 4] == piece_symbols[castling_color]['K'] and board[rook_home] == piece_symbols[castling_color]['R']:
+            castling.add(rook_home)
+    en_passant = None
+    if fields[3] != '-':
+        advanced_pawn = square_index(fields[3]) - color_dict[color_code]['direction'] * 8    # opposing pawn that advanced two ranks
+        for neighbor in (advanced_pawn - 1, advanced_pawn + 1):
+            if (neighbor // 8 == advanced_pawn // 8 and board[neighbor] == piece_symbols[color_code]['i'] and
+                    board[advanced_pawn] == piece_symbols[opposite_color(color_code)]['i']):
+                en_passant = square_index(fields[3])
+    position = set_up_position(board, piece_positions, color_code, frozenset(castling), en_passant, int(fields[4]))
+    waiting_king = list(position[opposite_color(color_code)]['K'].keys())[0]
+    if check(opposite_color(color_code), position, waiting_king) == True:
+        raise ValueError('FEN has side not to move in check: ' + fen)
+    return board, position, int(fields[5])
+
+# describes board and position in FEN; calls: board_placement
+def position_fen(board, current_position, fullmove_number=1):
+    castling = ''.join(letter for letter, rook_home in (('K', 7), ('Q', 0), ('k', 63), ('q', 56)) if rook_home in current_position['castling'])
+    en_passant = '-' if current_position['en_passant'] == None else square_name(current_position['en_passant'])
+    return '%s %s %s %s %d %d' % (board_placement(board), 'w' if current_position['turn'] == '*' else 'b', castling or '-', en_passant, current_position['halfmove_clock'], fullmove_number)
+
+# updates new_position in place; scope lists and seen_by list are replaced, never modified
+# only long-range pieces that seen_by shows to have lines through squares of move are looked up again; calls: add_pieces, delete_pieces, slider_scope
+def update_position(board, move_record, moved_pieces, deleted_pieces, new_position):
+    occupancy = new_position['occupancy']
+    for square in deleted_pieces:
+        occupancy &= ~(1 << square)
+    for square in moved_pieces:             # includes capture squares, which are also in deleted_pieces
+        occupancy |= 1 << square
+    new_position['occupancy'] = occupancy
+    seen_by = new_position['seen_by']
+    altered_locations = set()       # long-range pieces with lines discovered or obstructed by move
+    for square in itertools.chain(moved_pieces, deleted_pieces):
+        altered_locations |= seen_by[square]
+    old_scopes = {}                 # {location: scope} of long-range pieces before move, and after it in new_scopes
+    new_scopes = {}
+    for square, piece in deleted_pieces.items():
+        if piece[1] in slider_lines: old_scopes[square] = new_position[piece[0]][piece[1]][square]
     add_pieces(moved_pieces, new_position, board)
     delete_pieces(deleted_pieces, new_position)
-    discovery = {}
-    obstruction = {}
-    long_range_pieces = ('Q','R','B')
-    for path in iter_tree(new_position,{'2':lambda x: x in long_range_pieces},3):
-        color, piece, location = path[0][:3]      
-        for change, effect in [(deleted_pieces, discovery), (moved_pieces, obstruction)]:
-            for square in change:
-                if square in new_position[color][piece][location] and location != move_record['move_square']:
-                    effect.setdefault(square, [])
-                    effect[square].append(location)
-
-    for path in iter_tree(new_position,{'2':lambda x: x in long_range_pieces},3):
-        color, piece, location = path[0][:3]             
-        for effect, square_control in [(discovery, True), (obstruction, False)]:
-            for square in effect:
-                if location in effect[square]:
-                    current_scope = new_position[color][piece][location]
-                    altered_squares = []
-                    column = ord(square[0]) - 96
-                    row = int(square[1])
-                    h = relative_dir(ord(square[0]), ord(location[0]))
-                    v = relative_dir(int(square[1]), int(location[1]))
-                    evaluate_squares(h, v, column, row, piece, 'long_reach', board, altered_squares)
-                    if square_control == True:
-                        new_position[color][piece][location] = list(set(current_scope) | set(altered_squares))
-                    else:
-                        new_position[color][piece][location] = list(set(current_scope) - set(altered_squares))
+    if 'bitboards' in new_position:
+        update_bitboards(moved_pieces, deleted_pieces, new_position['bitboards'])
+    for change in (moved_pieces, deleted_pieces):
+        for square, piece in change.items():
+            new_position['zobrist'] ^= zobrist_pieces[piece[0]][piece[1]][square]
+    for square, piece in moved_pieces.items():
+        new_position['score'] += piece_square_values[piece[0]][piece[1]][square]
+    for square, piece in deleted_pieces.items():
+        new_position['score'] -= piece_square_values[piece[0]][piece[1]][square]
+    for square, piece in moved_pieces.items():
+        if piece[1] in slider_lines: new_scopes[square] = new_position[piece[0]][piece[1]][square]
+    for location in altered_locations:
+        if location in moved_pieces or location in deleted_pieces: continue     # scopes of pieces just placed or removed are already known
+        piece = board[location]
+        old_scopes[location] = new_position[piece[0]][piece[1]][location]
+        new_scopes[location] = new_position[piece[0]][piece[1]][location] = slider_scope(piece[1], location, occupancy)
+    if old_scopes == {} and new_scopes == {}:
+        return
+    seen_by = list(seen_by)
+    for location in old_scopes.keys() | new_scopes.keys():
+        old_scope = set(old_scopes.get(location, ()))
+        new_scope = set(new_scopes.get(location, ()))
+        for square in old_scope - new_scope:
+            seen_by[square] = seen_by[square] - {location}
+        for square in new_scope - old_scope:
+            seen_by[square] = seen_by[square] | {location}
+    new_position['seen_by'] = seen_by
+
+# makes move of game being played, adding its notation to move record, which test, search and perft moves made by move_piece do without; calls: move_piece, move_notation
+def play_move(board, color_code, move_record, move_log, current_position):
+    move_piece(board, color_code, move_record, move_log, current_position)
+    move_record.notation = move_notation(move_record)       # built once, so move log is never rebuilt from records
 
 # moves piece on board and adds move record to move_log
 def move_piece(board, color_code, move_record, move_log, current_position):
-    piece_code = move_record['piece_code']
+    piece_code = move_record.piece_code
     moved_pieces = {}
     deleted_pieces = {}
     if piece_code == 'O':                # move rook when castling
         piece_code = 'K'
-        back_rank = str(color_dict[color_code]['back_rank'])
-        rook_move_file = chr(101 + relative_dir(ord(move_record['castling_rook']), 101))   # 1 file in direction of rook from the e file (101 = ord('e'))
-        castled_rook_square = rook_move_file + back_rank
-        original_rook_square = move_record['castling_rook'] + back_rank
+        original_rook_square = move_record.castling_rook
+        castled_rook_square = move_record.start_square + relative_dir(original_rook_square, move_record.start_square)   # 1 square from king in direction of rook
         board[castled_rook_square] = board[original_rook_square]            # move rook to castling square
         board[original_rook_square] = '   '                                 # clear original rook squares
-        deleted_pieces[original_rook_square] = {'color_code': color_code, 'piece_code': 'R'}
-        moved_pieces[castled_rook_square] = {'color_code': color_code, 'piece_code': 'R'}
-    deleted_pieces[move_record['start_square']] = {'color_code': color_code, 'piece_code': piece_code}
-    if move_record['capture_square_contents'] != '   ':
-        deleted_pieces[move_record['move_square']] = {'color_code': opposite_color(color_code),
-                                                      'piece_code': move_record['capture_square_contents'][1]}
+        deleted_pieces[original_rook_square] = piece_symbols[color_code]['R']
+        moved_pieces[castled_rook_square] = piece_symbols[color_code]['R']
+    deleted_pieces[move_record.start_square] = piece_symbols[color_code][piece_code]
+    if move_record.capture_square_contents != '   ':
+        deleted_pieces[move_record.move_square] = move_record.capture_square_contents
     if piece_code == 'i':
-        if move_record['promotion'] != None:            # pawn promotion
-            piece_code = move_record['promotion']
-        elif    (move_record['start_square'][0] != move_record['move_square'][0] and     #en passant capture
-                 board[move_record['move_square']] == '   '):   
-            en_passant_square = move_record['move_square'][0] + move_record['start_square'][1]  # column of move square and row of start square
-            move_record['en_passant_capture'] = en_passant_square
+        if move_record.promotion != None:            # pawn promotion
+            piece_code = move_record.promotion
+        elif    (move_record.start_square % 8 != move_record.move_square % 8 and     #en passant capture
+                 board[move_record.move_square] == '   '):   
+            en_passant_square = move_record.start_square // 8 * 8 + move_record.move_square % 8  # column of move square and row of start square
+            move_record.en_passant_capture = en_passant_square
             board[en_passant_square] = '   '                # remove captured pawn
-            deleted_pieces[en_passant_square] = {'color_code': opposite_color(color_code), 'piece_code': 'i'}
+            deleted_pieces[en_passant_square] = piece_symbols[opposite_color(color_code)]['i']
 
-    board[move_record['move_square']] = color_code + piece_code + color_code  # place piece on mvoe square  
-    board[move_record['start_square']] = '   '          # clear original square
+    board[move_record.move_square] = piece_symbols[color_code][piece_code]  # place piece on mvoe square  
+    board[move_record.start_square] = '   '          # clear original square
     move_log[color_code].append(move_record)
-    moved_pieces[move_record['move_square']] = {'color_code': color_code, 'piece_code': piece_code}
-    new_position = copy.deepcopy(current_position)
-    update_position(board, color_code, move_record, moved_pieces, deleted_pieces, current_position, new_position)
-    for color in current_position:
-        current_position[color] = new_position[color]
+    moved_pieces[move_record.move_square] = piece_symbols[color_code][piece_code]
+    update_position(board, move_record, moved_pieces, deleted_pieces, current_position)
+    move_record.previous_state = (current_position['castling'], current_position['en_passant'], current_position['halfmove_clock'])     # restored by undo_move
+    castling = current_position['castling'] - {move_record.start_square, move_record.move_square}   # rook moved from or captured on home square
+    if piece_code == 'K':                   # king move ends both castling privileges
+        back_rank_start = (color_dict[color_code]['back_rank'] - 1) * 8
+        castling = castling - {back_rank_start, back_rank_start + 7}
+    en_passant = None
+    if move_record.piece_code == 'i' and abs(move_record.move_square - move_record.start_square) == 16:
+        for neighbor in (move_record.move_square - 1, move_record.move_square + 1):     # opposing pawn beside advanced pawn can capture en passant
+            if neighbor // 8 == move_record.move_square // 8 and board[neighbor] == piece_symbols[opposite_color(color_code)]['i']:
+                en_passant = (move_record.start_square + move_record.move_square) // 2
+    halfmove_clock = current_position['halfmove_clock'] + 1
+    if move_record.piece_code == 'i' or move_record.capture_square_contents != '   ':
+        halfmove_clock = 0
+    update_state(current_position, castling, en_passant, halfmove_clock)
+    count_position(current_position, 1)
+
+# passes turn to other color, replaces castling privileges, en passant square and halfmove clock of position and updates zobrist key for them and for side to move
+def update_state(current_position, castling, en_passant, halfmove_clock):
+    key = current_position['zobrist'] ^ zobrist_side
+    for rook_home in castling ^ current_position['castling']:
+        key ^= zobrist_castling[rook_home]
+    for square in (current_position['en_passant'], en_passant):
+        if square != None: key ^= zobrist_en_passant[square % 8]
+    current_position['zobrist'] = key
+    current_position['turn'] = opposite_color(current_position['turn'])
+    current_position['castling'] = castling
+    current_position['en_passant'] = en_passant
+    current_position['halfmove_clock'] = halfmove_clock
+
+def count_position(current_position, count):      # adds count (1 when position is reached, -1 when it is taken back) to occurrences of position in repetitions
+    repetitions = current_position['repetitions']
+    key = current_position['zobrist']
+    repetitions[key] = repetitions.get(key, 0) + count
+    if repetitions[key] == 0: del repetitions[key]
+
+# copies the piece dictionaries and state of current position so it can be restored exactly after a test move; scope lists are shared because update_position never modifies them
+def save_position(current_position):
+    saved_position = dict(current_position)       # state values like zobrist key are replaced, never modified
+    for color in color_dict:
+        saved_position[color] = {piece_code: dict(locations) for piece_code, locations in current_position[color].items()}
+    if 'bitboards' in current_position:
+        saved_position['bitboards'] = {color: dict(current_position['bitboards'][color]) for color in color_dict}
+    return saved_position
+
+# silently takes back a test move made by move_piece and restores the position saved before it; calls: reverse_move, count_position
+def unmake_move(board, color_code, move_log, current_position, saved_position):
+    move = move_log[color_code].pop()
+    reverse_move(board, color_code, move)
+    count_position(current_position, -1)        # repetitions are shared with saved position, so are taken back before it is restored
+    current_position.update(saved_position)
 
 # checks if king is currently in check; calls: opposite_color
 def check(color_code, current_position, king_position):
+    if 'bitboards' in current_position:
+        return bitboard_check(color_code, current_position, king_position)
     for location in iter_tree(current_position[opposite_color(color_code)],dim_limit=2):  #locations of all opposing pieces
         if king_position in location[1]:    #tests if king is attacked by any opposing piece
             return True
     return False
 
 # calculates all possible (not legal) pawn moves and captures; calls: opposite_color
-def pawn_moves_func(board, color_code, current_position, move_log):
+def pawn_moves_func(board, color_code, current_position):
     pawn_moves = {}                                #{'piece location': ['all', 'moves', 'for', 'this', 'pawn']}
     back_rank = color_dict[color_code]['back_rank']
+    advance = color_dict[color_code]['direction'] * 8     #index difference of 1 advance unit
     for pawn in current_position[color_code]['i']:         #pawn advance       piece_locations = {'color_code': {'piece_code': ['all', 'locations', 'of', 'this', 'piece', 'type']}}
-        single_advance = pawn[0] + str(int(pawn[1]) + color_dict[color_code]['direction'])      #adds 1 advance unit to pawn rank
+        single_advance = pawn + advance      #adds 1 advance unit to pawn rank
         if board[single_advance] == '   ':
             pawn_moves.setdefault(pawn, [])
             pawn_moves[pawn].append(single_advance)
-            double_advance = pawn[0] + str(int(pawn[1]) + (color_dict[color_code]['direction'] * 2))    #adds 2 advance units to pawn rank
-            if int(pawn[1]) == back_rank + color_dict[color_code]['direction'] and board[double_advance] == '   ':
+            double_advance = pawn + advance * 2    #adds 2 advance units to pawn rank
+            if pawn // 8 + 1 == back_rank + color_dict[color_code]['direction'] and board[double_advance] == '   ':
                 pawn_moves[pawn].append(double_advance)
-        if len(move_log[color_code]) > 0:
-            last_opposing_move = (move_log[opposite_color(color_code)][-1])
-            for capture in current_position[color_code]['i'][pawn]:
-                if      (board[capture][0] == opposite_color(color_code) or                                              #standard pawn capture, or...
-                        (last_opposing_move['piece_code'] == 'i' and                                                #opposing pawn just moved...
-                         int(last_opposing_move['start_square'][1]) == back_rank + color_dict[color_code]['direction'] * 6 and                  #... from starting square,...
-                         int(last_opposing_move['move_square'][1]) == back_rank + color_dict[color_code]['direction'] * 4 and                   #... moved ahead two ranks,...
-                         capture == last_opposing_move['move_square'][0] + str(back_rank + color_dict[color_code]['direction'] * 5))):          #... and capturing pawn can capture en passant
-                    pawn_moves.setdefault(pawn, [])
-                    pawn_moves[pawn].append(capture)
+        for capture in current_position[color_code]['i'][pawn]:
+            if      (board[capture][0] == opposite_color(color_code) or                     #standard pawn capture, or...
+                     capture == current_position['en_passant']):                          #... square behind opposing pawn that just advanced two ranks
+                pawn_moves.setdefault(pawn, [])
+                pawn_moves[pawn].append(capture)
     return pawn_moves
 
-def castling_privileges(board, color_code, current_position, move_log):     # determines if current player has kingside and/or queenside castling privileges; calls: check
+def castling_privileges(board, color_code, current_position):     # determines if current player has kingside and/or queenside castling privileges; calls: check
     castling_options = {}
-    back_rank = str(color_dict[color_code]['back_rank'])
-    king = {'home': 'e' + back_rank, 'cond': True}
-    k_rook = {'home': 'h' + back_rank, 'cond': True}
-    q_rook = {'home': 'a' + back_rank, 'cond': True}
-    if check(color_code, current_position, king['home']) == True:    #king must not be in check
-        king['cond'] = False
-    for move in move_log[color_code]:
-        if move['piece_code'] == 'K' or move ['piece_code'] == 'O':           #has king moved?
-            king['cond'] = False
-        elif move['piece_code'] == 'R' and move['start_square'] == q_rook['home']:     #has queen rook moved?
-            q_rook['cond'] = False
-        elif move['piece_code'] == 'R' and move['start_square'] == k_rook['home']:     #has king rook moved?
-            k_rook['cond'] = False
-    for rook in (k_rook, q_rook):
-        if king['cond'] == True and rook['cond'] == True:
-            squares_clear = True
-            if not king['home'] in current_position[color_code]['R'][rook['home']]:    #if king in rook's scope, all spaces between are clear
-                squares_clear = False
-            no_checks = True
-            rook_dir = relative_dir(ord(rook['home'][0]), 101)          # ordinals of rook and king files; result = 1 or -1
-            for i in (1, 2):
-                square = chr(101 + (i * rook_dir)) + back_rank          #squares king moves through
-                if check(color_code, current_position, square) == True: no_checks = False
-            if squares_clear == True and no_checks == True:
-                castling_options[king['home']] = [chr(101 + rook_dir * 2) + back_rank]      #{king_home_square: king_castle_square}
+    king_home = (color_dict[color_code]['back_rank'] - 1) * 8 + 4      # e file of back rank
+    rook_homes = [rook_home for rook_home in (king_home + 3, king_home - 4) if rook_home in current_position['castling']]    # king and rook have not moved, rook not captured
+    if rook_homes == [] or check(color_code, current_position, king_home) == True:    #king must not be in check
+        return castling_options
+    for rook_home in rook_homes:
+        squares_clear = True
+        if not king_home in current_position[color_code]['R'][rook_home]:    #if king in rook's scope, all spaces between are clear
+            squares_clear = False
+        no_checks = True
+        rook_dir = relative_dir(rook_home, king_home)          # result = 1 or -1
+        for i in (1, 2):
+            square = king_home + i * rook_dir          #squares king moves through
+            if check(color_code, current_position, square) == True: no_checks = False
+        if squares_clear == True and no_checks == True:
+            castling_options.setdefault(king_home, [])
+            castling_options[king_home].append(king_home + rook_dir * 2)      #{king_home_square: [king_castle_squares]}
     return castling_options
 
-# calculates all legal moves for current player and returns results in dictionary; calls: pawn_possible_moves, castling_privileges, move_piece, check
+# finds pieces checking the king and pieces absolutely pinned to it using attack maps of current position; calls: opposite_color, relative_dir, iter_tree
+def pins_and_checks(board, color_code, current_position):
+    king_position = list(current_position[color_code]['K'].keys())[0]
+    king_column = king_position % 8
+    king_row = king_position // 8
+    checks = []         # [['squares', 'that', 'capture', 'or', 'block', 'checking', 'piece']]
+    pins = {}           # {'pinned piece location': ['squares', 'on', 'pin', 'line']}
+    for indexes, scope in iter_tree(current_position[opposite_color(color_code)], dim_limit=2):
+        piece_code, location = indexes
+        column_diff = location % 8 - king_column
+        row_diff = location // 8 - king_row
+        if piece_code == 'R': aligned = column_diff == 0 or row_diff == 0
+        elif piece_code == 'B': aligned = abs(column_diff) == abs(row_diff)
+        elif piece_code == 'Q': aligned = column_diff == 0 or row_diff == 0 or abs(column_diff) == abs(row_diff)
+        else: aligned = False
+        if aligned == True:                 # long-range piece on line with king: collect squares from king up to and including piece
+            step = relative_dir(row_diff, 0) * 8 + relative_dir(column_diff, 0)
+            line = [king_position + step * d for d in range(1, max(abs(column_diff), abs(row_diff)) + 1)]
+            blockers = [square for square in line[:-1] if board[square] != '   ']
+            if blockers == []:
+                checks.append(line)
+            elif len(blockers) == 1 and board[blockers[0]][0] == color_code:
+                pins[blockers[0]] = line
+        elif king_position in scope:        # short-range check can only be answered by capture
+            checks.append([location])
+    return checks, pins
+
+# tests move by making it on the board and looking for check before taking it back; calls: save_position, move_piece, check, unmake_move
+def simulate_move(board, color_code, piece_code, location, move, move_log, current_position):
+    test_move = Move(piece_code, location, move, board[move])
+    saved_position = save_position(current_position)
+    move_piece(board, color_code, test_move, move_log, current_position)   #makes test move in place
+    king_position = list(current_position[color_code]['K'].keys())[0]
+    legal = check(color_code, current_position, king_position) == False        #disallows moves into check
+    unmake_move(board, color_code, move_log, current_position, saved_position)     #takes back test move
+    return legal
+
+# calculates all legal moves for current player and returns results in dictionary; calls: attack_map_legal_moves or bitboard_legal_moves
 def legal_moves_func(board, color_code, current_position, move_log):
+    if 'bitboards' in current_position:
+        return bitboard_legal_moves(board, color_code, current_position, move_log)
+    return attack_map_legal_moves(board, color_code, current_position, move_log)
+
+# remembers legal moves of recently seen positions by zobrist key, so positions revisited by undo, redo or restoring a game are not recalculated
+class LegalMovesCache:
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()      # {zobrist key: legal moves}, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def legal_moves(self, board, color_code, current_position, move_log):    # returns cached dictionary, which callers must not modify; calls: legal_moves_func
+        key = current_position['zobrist']
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        legal_moves = legal_moves_func(board, color_code, current_position, move_log)
+        self.entries[key] = legal_moves
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)          # evicts least recently used position
+        return legal_moves
+
+# calculates legal moves from attack maps of current position; calls: pawn_possible_moves, castling_privileges, pins_and_checks, simulate_move
+def attack_map_legal_moves(board, color_code, current_position, move_log):
     possible_moves = {}
     for indexes, controlled_square in iter_tree(current_position[color_code],{'1':lambda x: x != 'i'}):
         piece_code, location = indexes[:-1]
@@ -370,50 +790,193 @@ def legal_moves_func(board, color_code, current_position, move_log):
 
     if 'i' in current_position[color_code]:         #find pawn moves
         pawn_moves = {}
-        pawn_moves = pawn_moves_func(board, color_code, current_position, move_log)        #{'pawn_location': ['all', 'moves', 'for', 'this', 'pawn']}
+        pawn_moves = pawn_moves_func(board, color_code, current_position)        #{'pawn_location': ['all', 'moves', 'for', 'this', 'pawn']}
         for pawn in pawn_moves:
             possible_moves.setdefault('i', {})
             possible_moves['i'][pawn] = pawn_moves[pawn]
     legal_moves = {}            #legal_moves = {'piece_code': {'location': ['moves', 'for', 'this', 'piece']}}
 
+    checks, pins = pins_and_checks(board, color_code, current_position)
     for indexes, move in iter_tree(possible_moves):
         piece_code, location = indexes[:-1]
     #for piece_code in possible_moves:
     #    for location in possible_moves[piece_code]:
     #        for move in possible_moves[piece_code][location]:
-        test_move_dict = {'piece_code': piece_code, 'specifier': '', 'promotion': None,
-                            'start_square': location, 'move_square': move, 'capture_square_contents': '   ',
-                            'en_passant_capture': ''}
-        test_board = copy.deepcopy(board)
-        test_move_log = copy.deepcopy(move_log)
-        test_position = copy.deepcopy(current_position)
-        move_piece(test_board, color_code, test_move_dict, test_move_log, test_position)   #makes move on test board
-        king_position = list(test_position[color_code]['K'].keys())[0]
-        if check(color_code, test_position, king_position) == False:        #disallows moves into check
+        if piece_code == 'K' or (piece_code == 'i' and location % 8 != move % 8 and board[move] == '   '):     # king moves and en passant captures are tested on the board
+            legal = simulate_move(board, color_code, piece_code, location, move, move_log, current_position)
+        else:
+            legal = ((checks == [] or (len(checks) == 1 and move in checks[0])) and        # move must capture or block single checking piece...
+                     (location not in pins or move in pins[location]))                   # ...and pinned piece must stay on pin line
+        if legal == True:
             legal_moves.setdefault(piece_code, {})
             legal_moves[piece_code].setdefault(location, [])
             legal_moves[piece_code][location].append(move)
-    castling_moves = castling_privileges(board, color_code, current_position, move_log)
+    castling_moves = castling_privileges(board, color_code, current_position)
     if castling_moves != {}: legal_moves['O'] = castling_moves      # adds available castling moves
     return legal_moves
 
+# calculates legal captures and promotions for current player from attack maps of current position, leaving out the quiet moves legal_moves_func also finds
+# returns dictionary in same form as legal_moves_func; calls: opposite_color, pins_and_checks, simulate_move
+def legal_captures(board, color_code, current_position, move_log):
+    enemy_color = opposite_color(color_code)
+    last_rank = color_dict[enemy_color]['back_rank'] - 1
+    advance = color_dict[color_code]['direction'] * 8
+    en_passant = current_position['en_passant']
+    possible_moves = {}
+    for piece_code, locations in current_position[color_code].items():
+        for location, scope in locations.items():
+            targets = [square for square in scope if board[square][0] == enemy_color or (square == en_passant and piece_code == 'i')]
+            if piece_code == 'i' and (location + advance) // 8 == last_rank and board[location + advance] == '   ':
+                targets.append(location + advance)      # promotion without capture
+            if targets != []:
+                possible_moves.setdefault(piece_code, {})
+                possible_moves[piece_code][location] = targets
+    legal_moves = {}
+    if possible_moves == {}:
+        return legal_moves
+    checks, pins = pins_and_checks(board, color_code, current_position)
+    for piece_code, locations in possible_moves.items():
+        for location, targets in locations.items():
+            for move in targets:
+                if piece_code == 'K' or (piece_code == 'i' and move == en_passant and location % 8 != move % 8):    # king captures and en passant captures are tested on the board
+                    legal = simulate_move(board, color_code, piece_code, location, move, move_log, current_position)
+                else:
+                    legal = ((checks == [] or (len(checks) == 1 and move in checks[0])) and
+                             (location not in pins or move in pins[location]))
+                if legal == True:
+                    legal_moves.setdefault(piece_code, {})
+                    legal_moves[piece_code].setdefault(location, [])
+                    legal_moves[piece_code][location].append(move)
+    return legal_moves
+
+#--------------- bitboard functions
+
+def step_table(vectors):        # bitboards of squares reached from each square by one step of each vector
+    table = []
+    for index in range(64):
+        bits = 0
+        for h, v in vectors:
+            column = index % 8 + h
+            row = index // 8 + v
+            if 0 <= column < 8 and 0 <= row < 8:
+                bits |= 1 << (row * 8 + column)
+        table.append(bits)
+    return table
+
+knight_attacks = step_table(knight_vectors)
+king_attacks = step_table(king_queen_vectors)
+pawn_attacks = {color_code: step_table(pawn.get_vectors(color_dict[color_code]['direction'])) for color_code in color_dict}
+
+def slider_attacks(index, occupancy, piece_code):      # bitboard of squares attacked by queen, rook or bishop on index; rays stop at and include first occupied square
+    attacks = 0
+    for mask, line_attacks in (table[index] for table in slider_lines[piece_code]):
+        attacks |= line_attacks[occupancy & mask][1]
+    return attacks
+
+def update_bitboards(moved_pieces, deleted_pieces, bitboards):
+    for square, piece in moved_pieces.items():
+        bitboards[piece[0]][piece[1]] |= 1 << square
+    for square, piece in deleted_pieces.items():
+        bitboards[piece[0]][piece[1]] &= ~(1 << square)
+
+def occupied_squares(pieces):
+    occupancy = 0
+    for bits in pieces.values():
+        occupancy |= bits
+    return occupancy
+
+# tests if square on index is attacked by pieces of color_code; captured is bitboard of an attacking piece to ignore; calls: opposite_color, slider_attacks
+def bitboard_attacked(index, color_code, bitboards, occupancy, captured=0):
+    pieces = bitboards[color_code]
+    if (knight_attacks[index] & pieces['N'] |
+        king_attacks[index] & pieces['K'] |
+        pawn_attacks[opposite_color(color_code)][index] & pieces['i']) & ~captured:
+        return True
+    if slider_attacks(index, occupancy, 'R') & (pieces['R'] | pieces['Q']) & ~captured:
+        return True
+    if slider_attacks(index, occupancy, 'B') & (pieces['B'] | pieces['Q']) & ~captured:
+        return True
+    return False
+
+# bitboard version of check; calls: bitboard_attacked, occupied_squares
+def bitboard_check(color_code, current_position, king_position):
+    bitboards = current_position['bitboards']
+    occupancy = occupied_squares(bitboards['*']) | occupied_squares(bitboards['-'])
+    return bitboard_attacked(king_position, opposite_color(color_code), bitboards, occupancy)
+
+# calculates legal moves from bitboards; returns same dictionary as attack_map_legal_moves; calls: bitboard_attacked, castling_privileges
+def bitboard_legal_moves(board, color_code, current_position, move_log):
+    bitboards = current_position['bitboards']
+    enemy_color = opposite_color(color_code)
+    own_occupancy = occupied_squares(bitboards[color_code])
+    enemy_occupancy = occupied_squares(bitboards[enemy_color])
+    occupancy = own_occupancy | enemy_occupancy
+    king_index = bitboards[color_code]['K'].bit_length() - 1
+    direction = color_dict[color_code]['direction']
+    en_passant = 0                  # bit of square behind opposing pawn that just advanced two ranks
+    if current_position['en_passant'] != None:
+        en_passant = 1 << current_position['en_passant']
+    legal_moves = {}
+    for piece_code, pieces in bitboards[color_code].items():
+        while pieces:
+            start_bit = pieces & -pieces
+            pieces ^= start_bit
+            start = start_bit.bit_length() - 1
+            if piece_code == 'i':
+                targets = pawn_attacks[color_code][start] & (enemy_occupancy | en_passant)
+                single_advance = start + direction * 8
+                if not occupancy >> single_advance & 1:
+                    targets |= 1 << single_advance
+                    double_advance = single_advance + direction * 8
+                    if start // 8 + 1 == color_dict[color_code]['back_rank'] + direction and not occupancy >> double_advance & 1:
+                        targets |= 1 << double_advance
+            elif piece_code == 'N': targets = knight_attacks[start] & ~own_occupancy
+            elif piece_code == 'K': targets = king_attacks[start] & ~own_occupancy
+            else: targets = slider_attacks(start, occupancy, piece_code) & ~own_occupancy
+            while targets:
+                target_bit = targets & -targets
+                targets ^= target_bit
+                captured = target_bit & enemy_occupancy
+                new_occupancy = occupancy ^ start_bit | target_bit
+                if piece_code == 'i' and target_bit == en_passant:        # en passant capture removes pawn behind move square
+                    captured = en_passant >> 8 if direction == 1 else en_passant << 8
+                    new_occupancy ^= captured
+                if piece_code == 'K': king_square = target_bit.bit_length() - 1
+                else: king_square = king_index
+                if bitboard_attacked(king_square, enemy_color, bitboards, new_occupancy, captured) == False:
+                    legal_moves.setdefault(piece_code, {})
+                    legal_moves[piece_code].setdefault(start, [])
+                    legal_moves[piece_code][start].append(target_bit.bit_length() - 1)
+    castling_moves = castling_privileges(board, color_code, current_position)
+    if castling_moves != {}: legal_moves['O'] = castling_moves      # adds available castling moves
+    return legal_moves
+
+# runs both move generators on a position that keeps bitboards and returns moves found by only one of them
+def compare_cores(board, color_code, current_position, move_log):
+    results = []
+    for generator in (attack_map_legal_moves, bitboard_legal_moves):
+        legal_moves = generator(board, color_code, current_position, move_log)
+        results.append({tuple(indexes[:2]) + (move,) for indexes, move in iter_tree(legal_moves)})
+    return results[0] ^ results[1]
+
 # --------------------------- move execution functions
 
 def show_legal_moves(board, piece_square, legal_moves): # shows legal moves for piece on specified square when requested
     if piece_square == 'O':
         if 'O' in legal_moves:
             print('\nCastling options: ', end='')
-            for castle in legal_moves['O']:
-                print(castle + '  ', end='')
+            for king_home in legal_moves['O']:
+                for castle in legal_moves['O'][king_home]:
+                    print('K' + square_name(castle) + '  ', end='')
         else:
             print('You cannot castle at this time.')
         print()
     else:
         piece_code = board[piece_square][1]             # middle character in board square
-        print('\n' + piece_code + piece_square + ': ', end='')
-        if piece_square in legal_moves.get(piece_code, ''):
+        print('\n' + piece_code + square_name(piece_square) + ': ', end='')
+        if piece_square in legal_moves.get(piece_code, {}):
             for move in legal_moves[piece_code][piece_square]:
-                print(move + '  ', end='')
+                print(square_name(move) + '  ', end='')
             print()
         else:
             print('There are no legal moves for that piece.')
@@ -422,7 +985,8 @@ def show_legal_moves(board, piece_square, legal_moves): # shows legal moves for
 def specify_piece(piece_code, piece_option):    # asks player to specify piece when multiple options available
     piece_name = piece_family_dict[piece_code].name
     print('You can make that move with the %s(s) on the following square(s):' % (piece_name,))
-    for location in piece_option:
+    option_names = [square_name(location) for location in piece_option]
+    for location in option_names:
         print(location, '\t', end='')
     game_state = 0
     choice = ''
@@ -433,10 +997,11 @@ Please type the location of the {piece_name} you would like to use.
 Type < to reenter your move.
 ''')
         choice = input()
-        if choice in piece_option: game_state = 1
+        if choice in option_names: game_state = 1
         elif choice != '<':
             print('That is not a valid choice. Please try again.')
-    return (choice, game_state)
+    if game_state == 1: return (square_index(choice), game_state)
+    return (None, game_state)
 
 def pawn_promotion():   # asks player to select piece to promote to
     promotion_list = ['Q', 'R', 'B', 'N']
@@ -453,29 +1018,24 @@ Type ? to see a list of available promotions. Type < to reenter your move.''')
         elif choice != '<': print('That is not a valid choice. Please try again.')
     return(choice, game_state)
 
-def necessary_specifier(piece_option, start_square):    # determines necessary elements in specifier and returns specifier in minimum essential form; favors file over rank
-    if len(piece_option) == 1:          # no specifier necessary
+def necessary_specifier(piece_option, start_square):    # determines necessary elements in specifier and returns specifier in minimum essential form; favors file over rank, as in SAN
+    other_options = [square_name(location) for location in piece_option if location != start_square]
+    start_square = square_name(start_square)
+    if other_options == []:             # no specifier necessary
         specifier = ''
-    else:
-        column_dup = False              # column specifier unnecessary if False
-        row_dup = False                 # row specifier unnecessary if True
-        duplicates = []
-        for location in piece_option:               #find duplicates of column and/or row in piece option
-            if location[0] in duplicates: column_dup = True
-            if location[1] in duplicates: row_dup = True
-            duplicates.append(location[0])
-            duplicates.append(location[1])
-        if column_dup == False: specifier = start_square[0]                    #remove unnecessary element of specifier
-        elif row_dup == False: specifier = start_square[1]
-        else: specifier = start_square  # if neither unnecessary, use full specifier
+    elif start_square[0] not in [location[0] for location in other_options]:      # file tells piece apart from others
+        specifier = start_square[0]
+    elif start_square[1] not in [location[1] for location in other_options]:      # rank tells piece apart from others
+        specifier = start_square[1]
+    else: specifier = start_square      # if neither is enough, use full specifier
     return specifier
 
 # matches interpreted move to eligible pieces and selects appropriate piece based on user input; calls: specify_piece, pawn_promotion, necessary_specifier
 def find_matching_moves(legal_moves, piece_code, color_code, specifier, move_square, promotion):
     if specifier == None: specifier = ''
-    matching_pieces = legal_moves.get(piece_code, {'empty': ''})    #finds squares with matching piece type; yields dictionary with 'empty: '' as placeholder to type prevent error if no matching pieces
+    matching_pieces = legal_moves.get(piece_code, {})    #finds squares with matching piece type
     piece_option = [location for location in matching_pieces if move_square in matching_pieces[location]]        #stores eligible-piece locations[]
-    start_square = ''
+    start_square = None
     game_state = 1    # game play set to proceed unless no move is found
     if len(piece_option) == 0:          # = no eligible piece
         print('That is not a legal move. Please try again.')
@@ -487,31 +1047,33 @@ def find_matching_moves(legal_moves, piece_code, color_code, specifier, move_squ
             match_regex = specifier + r'[1-8]'
         else: match_regex = r'[a-h]' + specifier
         option_match = re.compile(match_regex)
-        match = [m for m in piece_option if option_match.search(m) != None]
+        match = [m for m in piece_option if option_match.search(square_name(m)) != None]
         if len(match) == 1: start_square = match[0]
     elif len(specifier) == 2:       # both coordinates specified
-        if specifier in piece_option: start_square = specifier
+        if square_index(specifier) in piece_option: start_square = square_index(specifier)
     if game_state == 1:       # if there are eligible pieces
-        if start_square == '':      # piece not yet specified
+        if start_square == None:      # piece not yet specified
             start_square, game_state = specify_piece(piece_code, piece_option)
-            specifier = start_square
-        if start_square != '':      # must be "if" condition, not "else" because previous conditional may identify start square
+            specifier = 'specified'
+        if start_square != None:      # must be "if" condition, not "else" because previous conditional may identify start square
             if specifier != '' and specifier != '-O':
                 specifier = necessary_specifier(piece_option, start_square)
             if piece_code == 'i':
-                if move_square[0] != start_square[0]:   # pawn is capturing
-                    specifier = start_square[0]
-                if promotion == None and move_square[-1] == str(color_dict[opposite_color(color_code)]['back_rank']):   #promotion not yet specified
+                if move_square % 8 != start_square % 8:   # pawn is capturing
+                    specifier = square_name(start_square)[0]
+                if promotion == None and move_square // 8 + 1 == color_dict[opposite_color(color_code)]['back_rank']:   #promotion not yet specified
                     promotion, game_state = pawn_promotion()             
     return (start_square, specifier, promotion, game_state)
 
-# validates, interprets, identifies, and executes move entered by player; calls: show_legal_moves, find_matching_moves, move_piece
-def execute_move(board, color_code, chosen_move, legal_moves, move_log, redo_move_log, current_position):
+# interprets move entered by player or read from PGN: returns (piece_code, specifier, move_square, promotion, castling_rook), or None if move format is not valid
+# piece_code is '?' and move_square is the square asked about (or 'O') for requests to show legal moves; check and annotation marks of SAN (+ # ! ?) are ignored
+def interpret_move(chosen_move, color_code):
     piece_move_format = re.compile(r'^([KQRBN])(([a-h])?([1-8])?)(x)?([a-h][1-8])$')
     pawn_move_format = re.compile(r'^(([a-h])x)?([a-h][1-8])(=(Q|R|B|N))?$')
     castling_move_format = re.compile(r'^O((-)?O)?(-)?O$')
     question_format = re.compile(r'^\?(O|[a-h][1-8])$')
-    
+
+    if chosen_move[:1] != '?': chosen_move = chosen_move.rstrip('+#!?')
     piece_move = piece_move_format.search(chosen_move)
     pawn_move = pawn_move_format.search(chosen_move)
     castling_move = castling_move_format.search(chosen_move)
@@ -523,57 +1085,66 @@ def execute_move(board, color_code, chosen_move, legal_moves, move_log, redo_mov
     if piece_move != None:
         piece_code = piece_move.group(1)    # ^([KQRBN])
         specifier = piece_move.group(2)     # (([a-h])?([1-8])?)
-        move_square = piece_move.group(6)   # ([a-h][1-8])$
+        move_square = square_index(piece_move.group(6))   # ([a-h][1-8])$
     elif pawn_move != None:
         piece_code = 'i'
         specifier = pawn_move.group(2)      # ^([a-h])?
-        move_square = pawn_move.group(3)    # ([a-h][1-8])
+        move_square = square_index(pawn_move.group(3))    # ([a-h][1-8])
         promotion = pawn_move.group(5)      # (=(Q|R|B|N))?$
     elif castling_move != None:
-        back_rank = str(color_dict[color_code]['back_rank'])
+        king_home = (color_dict[color_code]['back_rank'] - 1) * 8 + 4      # e file of back rank
         piece_code = 'O'
         if castling_move.group(1) == None:
-            move_square = 'g' + back_rank
-            castling_rook = 'h'
+            move_square = king_home + 2         # g file
+            castling_rook = king_home + 3       # h file
         else:
             specifier = '-O'
-            move_square = 'c' + back_rank
-            castling_rook = 'a'
+            move_square = king_home - 2         # c file
+            castling_rook = king_home - 4       # a file
     elif question != None:
         piece_code = '?'
-        piece_square = question.group(1)    # (O|[a-h][1-8])$
+        move_square = question.group(1)    # (O|[a-h][1-8])$
+        if move_square != 'O': move_square = square_index(move_square)
     else:       # fails to match any valid format
+        return None
+    return (piece_code, specifier, move_square, promotion, castling_rook)
+
+# validates, interprets, identifies, and executes move entered by player; calls: interpret_move, show_legal_moves, find_matching_moves, play_move
+def execute_move(board, color_code, chosen_move, legal_moves, move_log, redo_move_log, current_position):
+    interpretation = interpret_move(chosen_move, color_code)
+    if interpretation == None:       # fails to match any valid format
         print('That is not a valid move. Please try again.')
         game_state = 0      # restart turn
         return game_state
-    
+    piece_code, specifier, move_square, promotion, castling_rook = interpretation
+
     if piece_code == '?':           # finds and displays legal moves for specific piece
-        show_legal_moves(board, piece_square, legal_moves)
+        show_legal_moves(board, move_square, legal_moves)
         game_state = 0
     else:       # interpret response as move 
         start_square, specifier, promotion, game_state = find_matching_moves(legal_moves, piece_code, color_code, specifier, move_square, promotion)
             
     if game_state == 1:       # execute and record move
-        move_record = {'piece_code': piece_code, 'specifier': specifier, 'promotion': promotion, 'castling_rook': castling_rook,
-                       'start_square': start_square, 'move_square': move_square, 'capture_square_contents': board[move_square],
-                       'en_passant_capture': ''}
-        move_piece(board, color_code, move_record, move_log, current_position)
+        move_record = Move(piece_code, start_square, move_square, board[move_square], specifier, promotion, castling_rook)
+        play_move(board, color_code, move_record, move_log, current_position)
         del redo_move_log[:]        # moves cannot be redone once new line has been initiated
     return game_state            # 0 = restart turn   1 = proceed to next turn
 
 
 #---------------- auxillary functions
 
-def save_game(move_log):                    # saves move log to text file
-    move_table = display_move_log(move_log)
-    print('Enter a filename to save the game.')
+def save_game(move_log):                    # saves move log to text file, or to PGN file if filename ends with .pgn
+    print('Enter a filename to save the game. (End it with .pgn to save in PGN format.)')
     filename = input()
     if ':' in filename or filename == '':   # blocks incorrect filenames that won't cause error
         print('That is not a valid filename.')
         return
     folder = os.path.join('.', 'chess_log_files')
     if os.path.isdir(folder) == False: os.makedirs(folder)
-    if not filename.endswith('.txt'): filename += '.txt'
+    if filename.endswith('.pgn'): move_table = move_log_pgn(move_log)
+    else:
+        if not filename.endswith('.txt'): filename += '.txt'
+        move_table = display_move_log(move_log)
     try:
         new_log_file = open(os.path.join(folder, filename), 'w+')
         new_log_file.write(move_table)
@@ -582,24 +1153,31 @@ def save_game(move_log):                    # saves move log to text file
     except:
         print('That is not a valid filename.')
 
-# compiles, organizes, and displays log of previous moves; calls: save_game()
+# builds notation of move from its record, as shown in move log
+def move_notation(move):
+    if move.piece_code == 'O':
+        return 'O' + move.specifier + '-O'
+    move_code = square_name(move.move_square)        # starts building move notation
+    if move.capture_square_contents != '   ' or move.en_passant_capture != None:    # capture took place
+        move_code = 'x' + move_code
+    if move.specifier != '':
+        move_code = move.specifier + move_code
+    if move.piece_code in ('K', 'Q', 'R', 'B', 'N'):
+        move_code = move.piece_code + move_code
+    if move.promotion != None:
+        move_code = move_code + '=' + move.promotion
+    return move_code
+
+def uci_notation(move):     # coordinate notation of move used by UCI: start square, move square and promotion piece, e.g. e2e4, e7e8q, e1g1 for castling
+    return square_name(move.start_square) + square_name(move.move_square) + (move.promotion or '').lower()
+
+# compiles, organizes, and displays log of previous moves from notation play_move keeps in move records
 def display_move_log(move_log):
     move_table = ''
     for move_number in range(len(move_log['*'])):
         move_table += (str(move_number + 1) + ':').ljust(5)     # adds move number and aligns following text
         for color in move_log:
-            move = move_log[color][move_number]                 # next move in log
-            move_code = move['move_square']                     # starts building move notation
-            if move['capture_square_contents'] != '   ' or move['en_passant_capture'] != '':    # capture took place
-                move_code = 'x' + move_code
-            if move['specifier'] != '':
-                move_code = move['specifier'] + move_code
-            if move['piece_code'] in ('K', 'Q', 'R', 'B', 'N', 'O'):
-                move_code = move['piece_code'] + move_code       
-            if move['promotion'] != None:
-                move_code = move_code + '=' + move['promotion']
-            if move['piece_code'] == 'O':
-                move_code = 'O' + move['specifier'] + '-O'
+            move_code = move_log[color][move_number].notation     # next move in log
             if color == '*':
                 move_table += move_code.ljust(10)               # adds white's move to table and aligns following text for blacks move      
                 if len(move_log['-']) == move_number:           # terminates loop on with white on last move if no corresponding move for black
@@ -609,44 +1187,51 @@ def display_move_log(move_log):
                 move_table += move_code + '\n'                  # adds black's move
     return(move_table)
 
-# undoes last move in move log; calls: opposite_color
-def undo_move(board, color_code, move_log, redo_move_log, current_position):
-    if move_log[color_code] == []:
-        print('There are no moves to undo.')
-        game_state = 0
-        return game_state
-    game_state = 1
-    move = move_log[color_code].pop()                           # retrieves and deletes record of last move for color designated by function call
-    piece_code = move['piece_code']
+# reverses move on board and returns pieces restored to and withdrawn from board; calls: opposite_color, relative_dir
+def reverse_move(board, color_code, move):
+    piece_code = move.piece_code
     restored_pieces = {}
     withdrawn_pieces = {}
-    if move['capture_square_contents'] != '   ':
-        restored_pieces[move['move_square']] = {'color_code': opposite_color(color_code), 'piece_code': move['capture_square_contents'][1]}
-    board[move['start_square']] = board[move['move_square']]    # reverses move
-    board[move['move_square']] = move['capture_square_contents']
+    if move.capture_square_contents != '   ':
+        restored_pieces[move.move_square] = move.capture_square_contents
+    board[move.start_square] = board[move.move_square]    # reverses move
+    board[move.move_square] = move.capture_square_contents
     if piece_code == 'O':                               # reverses castling
         piece_code = 'K'
-        rook_move_file = chr(101 + relative_dir(ord(move['castling_rook']), 101))   # --- 1 file in direction of rook from the e file (101 = ord('e'))
-        castled_rook_square = rook_move_file + str(color_dict[color_code]['back_rank'])
-        original_rook_square = move['castling_rook'] + str(color_dict[color_code]['back_rank'])
+        original_rook_square = move.castling_rook
+        castled_rook_square = move.start_square + relative_dir(original_rook_square, move.start_square)   # --- 1 square from king in direction of rook
         board[original_rook_square] = board[castled_rook_square]                    #move rook to pre-castling position
         board[castled_rook_square] = '   '
-        restored_pieces[original_rook_square] = {'color_code': color_code, 'piece_code': 'R'}
-        withdrawn_pieces[castled_rook_square] = {'color_code': color_code, 'piece_code': 'R'}
-    restored_pieces[move['start_square']] = {'color_code': color_code, 'piece_code': piece_code}
-    if move['promotion'] != None:
-        board[move['start_square']] = color_code + 'i' + color_code
-        piece_code = move['promotion']
-    elif move['en_passant_capture'] != '':
-        en_passant_square = move['en_passant_capture']
-        board[en_passant_square] = opposite_color(color_code) + 'i' + opposite_color(color_code)    #restores pawn captured en_passant
-        restored_pieces[en_passant_square] = {'color_code': opposite_color(color_code), 'piece_code': 'i'}
-    redo_move_log.append(move)          # only undone moves can be redone
-    withdrawn_pieces[move['move_square']] = {'color_code': color_code, 'piece_code': piece_code}
-    restored_position = copy.deepcopy(current_position)
-    update_position(board, color_code, move, restored_pieces, withdrawn_pieces, current_position, restored_position)
-    for color in current_position:
-        current_position[color] = restored_position[color]
+        restored_pieces[original_rook_square] = piece_symbols[color_code]['R']
+        withdrawn_pieces[castled_rook_square] = piece_symbols[color_code]['R']
+    restored_pieces[move.start_square] = piece_symbols[color_code][piece_code]
+    if move.promotion != None:
+        board[move.start_square] = piece_symbols[color_code]['i']
+        piece_code = move.promotion
+    elif move.en_passant_capture != None:
+        en_passant_square = move.en_passant_capture
+        board[en_passant_square] = piece_symbols[opposite_color(color_code)]['i']    #restores pawn captured en_passant
+        restored_pieces[en_passant_square] = piece_symbols[opposite_color(color_code)]['i']
+    withdrawn_pieces[move.move_square] = piece_symbols[color_code][piece_code]
+    return restored_pieces, withdrawn_pieces
+
+# takes back last move of color in move log and returns its record; calls: count_position, reverse_move, update_position, update_state
+def retract_move(board, color_code, move_log, current_position):
+    move = move_log[color_code].pop()                           # retrieves and deletes record of last move for color designated by function call
+    count_position(current_position, -1)
+    restored_pieces, withdrawn_pieces = reverse_move(board, color_code, move)
+    update_position(board, move, restored_pieces, withdrawn_pieces, current_position)
+    update_state(current_position, *move.previous_state)
+    return move
+
+# undoes last move in move log; calls: retract_move
+def undo_move(board, color_code, move_log, redo_move_log, current_position):
+    if move_log[color_code] == []:
+        print('There are no moves to undo.')
+        game_state = 0
+        return game_state
+    game_state = 1
+    redo_move_log.append(retract_move(board, color_code, move_log, current_position))          # only undone moves can be redone
     return game_state
 
 def end_of_game(board, color_code, move_log, redo_move_log, current_position):    # handles end-of-game options; calls: display_move_log, undo_move, opposite_color
@@ -696,57 +1281,1055 @@ def game_options(board, color_code, chosen_move, move_log, redo_move_log, curren
         game_state = end_of_game(board, color_code, move_log, redo_move_log, current_position)
     return game_state
 
-# checks for conditions of check, checkmate, stalemate, and insufficient material at beginning of turn; calls end_of_game in case of checkmate or draw
-# calls: check, end_of_game
+# determines if game is over at beginning of turn: returns 'checkmate', 'stalemate', 'insufficient material', 'threefold repetition', 'fifty-move rule',
+# or None if play continues; repetitions and halfmove clock kept in position make every test O(1); calls: check
+def game_outcome(color_code, current_position, legal_moves):
+    if legal_moves == {}:
+        king_position = list(current_position[color_code]['K'].keys())[0]
+        if check(color_code, current_position, king_position) == True:
+            return 'checkmate'
+        return 'stalemate'
+    if len(current_position[color_code]) < 3 and len(current_position[opposite_color(color_code)]) == 1:    # possibility of insufficient material
+        sufficient_material = None
+        if      (len(current_position[color_code]) == 2 and           # knight/bishop + king vs. lone king = insufficient material
+                'B' not in current_position[color_code] and
+                'N' not in current_position[color_code]):
+            sufficient_material = True
+        if sufficient_material != True:
+            return 'insufficient material'
+    if current_position['repetitions'][current_position['zobrist']] >= 3:
+        return 'threefold repetition'
+    if current_position['halfmove_clock'] >= 100:      # fifty moves by each side without capture or pawn move
+        return 'fifty-move rule'
+    return None
+
+# announces check, checkmate, stalemate, insufficient material, repetition and fifty-move rule at beginning of turn; calls end_of_game in case of checkmate or draw
+# calls: game_outcome, check, end_of_game
 def mate_check_draw(board, color_code, silent_mode, current_position, legal_moves, move_log, redo_move_log):
     game_state = 0
-    king_position = list(current_position[color_code]['K'].keys())[0]
-    if check(color_code, current_position, king_position) == True:      # detects check
-        if legal_moves == {}:                                           # checkmate
-            print('Checkmate! ' + color_dict[opposite_color(color_code)]['color'].capitalize() + ' wins!')
-            game_state = -1
-        elif silent_mode == False:                                        # simple check
-           print('The ' + color_dict[color_code]['color'] + ' king is in check.')
-    elif legal_moves == {}:         # stalemate
+    outcome = game_outcome(color_code, current_position, legal_moves)
+    if outcome == 'checkmate':
+        print('Checkmate! ' + color_dict[opposite_color(color_code)]['color'].capitalize() + ' wins!')
+    elif outcome == 'stalemate':
         print('Stalemate! The game is drawn.')
-        game_state = -1
-    if game_state == 0:       # no checkmate or stalemate
-        if len(current_position[color_code]) < 3 and len(current_position[opposite_color(color_code)]) == 1:    # possibility of insufficient material
-            sufficient_material = None
-            if      (len(current_position[color_code]) == 2 and           # knight/bishop + king vs. lone king = insufficient material
-                    'B' not in current_position[color_code] and
-                    'N' not in current_position[color_code]):
-                sufficient_material = True
-            if sufficient_material != True:
-                print('The game is drawn due to insufficient material.')
-                game_state = -1
-    if game_state == -1:
+    elif outcome == 'insufficient material':
+        print('The game is drawn due to insufficient material.')
+    elif outcome == 'threefold repetition':
+        print('The game is drawn by threefold repetition of the position.')
+    elif outcome == 'fifty-move rule':
+        print('The game is drawn by the fifty-move rule: fifty moves each without a capture or pawn move.')
+    elif silent_mode == False:                                        # simple check
+        king_position = list(current_position[color_code]['K'].keys())[0]
+        if check(color_code, current_position, king_position) == True:
+            print('The ' + color_dict[color_code]['color'] + ' king is in check.')
+    if outcome != None:
         game_state = end_of_game(board, color_code, move_log, redo_move_log, current_position)
     return game_state
 
 
+#---------------- headless game interface
+
+# Move records of all legal moves in legal_moves dictionary, one per promotion piece, with specifier as shown in move log
+# specify = False leaves out specifiers of pieces other than pawns, which only notation needs; calls: necessary_specifier
+def legal_move_records(board, color_code, legal_moves, specify=True):
+    last_rank = color_dict[opposite_color(color_code)]['back_rank'] - 1
+    moves = []
+    for piece_code, locations in legal_moves.items():
+        for location, targets in locations.items():
+            for move_square in targets:
+                specifier = ''
+                promotions = [None]
+                castling_rook = None
+                if piece_code == 'O':
+                    if move_square < location:      # queenside
+                        specifier = '-O'
+                        castling_rook = location - 4
+                    else: castling_rook = location + 3
+                elif piece_code == 'i':
+                    if move_square % 8 != location % 8:     # pawn is capturing
+                        specifier = square_name(location)[0]
+                    if move_square // 8 == last_rank:
+                        promotions = ['Q', 'R', 'B', 'N']
+                elif specify == True:
+                    piece_option = [option for option in locations if move_square in locations[option]]
+                    specifier = necessary_specifier(piece_option, location)
+                for promotion in promotions:
+                    move = Move(piece_code, location, move_square, board[move_square], specifier, promotion, castling_rook)
+                    if piece_code == 'i' and move_square % 8 != location % 8 and board[move_square] == '   ':
+                        move.en_passant_capture = location // 8 * 8 + move_square % 8       # also set by move_piece; needed for notation before move is made
+                    moves.append(move)
+    return moves
+
+class Game:         # game that can be played without input() or print(): moves are Move records from legal_moves(), or their notation as shown in move log
+    def __init__(self, fen=None):       # starts from starting position, or from position described by FEN; calls: arrange_board, fen_position
+        if fen == None:
+            self.board, self.position = arrange_board()
+            self.start_fullmove_number = 1
+        else: self.board, self.position, self.start_fullmove_number = fen_position(fen)
+        self.start_fen = fen
+        self.move_log = {'*': [], '-': []}      # {'color_code': [Move, Move, ...]}
+        self.legal_moves_cache = LegalMovesCache()
+
+    def turn(self):             # color code of side to move
+        return self.position['turn']
+
+    def fullmove_number(self):  # number of current move pair, counted from 1 and increased after black moves
+        return self.start_fullmove_number + len(self.move_log['-'])
+
+    def fen(self):              # calls: position_fen
+        return position_fen(self.board, self.position, self.fullmove_number())
+
+    def legal_move_table(self):     # {'piece_code': {location: [moves, for, this, piece]}} as returned by legal_moves_func
+        return self.legal_moves_cache.legal_moves(self.board, self.turn(), self.position, self.move_log)
+
+    def legal_moves(self):      # Move records of all legal moves, one per promotion piece; calls: legal_move_records
+        return legal_move_records(self.board, self.turn(), self.legal_move_table())
+
+    def captures(self):         # Move records of legal captures and promotions only; calls: legal_captures, legal_move_records
+        return legal_move_records(self.board, self.turn(), legal_captures(self.board, self.turn(), self.position, self.move_log))
+
+    # legal Move record for move in any notation execute_move accepts, including SAN, or in UCI coordinate notation
+    # raises ValueError unless exactly one legal move matches; calls: uci_notation, interpret_move
+    def parse_move(self, text):
+        if re.search(r'^[a-h][1-8][a-h][1-8][qrbn]?$', text) != None:         # coordinate notation, e.g. e2e4 or e7e8q
+            matches = [move for move in self.legal_moves() if uci_notation(move) == text]
+            if matches == []:
+                raise ValueError('illegal move: ' + text)
+            return matches[0]
+        interpretation = interpret_move(text, self.turn())
+        if interpretation == None or interpretation[0] == '?':
+            raise ValueError('not a move: ' + text)
+        piece_code, specifier, move_square, promotion, castling_rook = interpretation
+        if specifier == None: specifier = ''
+        matches = []
+        for move in self.legal_moves():
+            start_square = square_name(move.start_square)
+            if move.piece_code != piece_code or move.move_square != move_square or move.promotion != promotion:
+                continue
+            if piece_code == 'i' and start_square[0] != (specifier or square_name(move_square)[0]):   # pawn advances within its file unless capture file is given
+                continue
+            if piece_code != 'i' and piece_code != 'O' and not start_square.startswith(specifier) and not start_square.endswith(specifier):
+                continue
+            matches.append(move)
+        if len(matches) != 1:
+            raise ValueError(('illegal move: ' if matches == [] else 'ambiguous move: ') + text)
+        return matches[0]
+
+    # plays legal move given as Move record or notation; a Move record is replaced by the record of the same move in the current position,
+    # so records kept from an earlier position cannot bring stale capture or specifier; raises ValueError for illegal moves; calls: parse_move, move_key, move_notation, play_move
+    def push(self, move):
+        if isinstance(move, str):
+            move = self.parse_move(move)
+        else:
+            matches = [legal_move for legal_move in self.legal_moves() if move_key(legal_move) == move_key(move)]
+            if matches == []:
+                raise ValueError('illegal move: ' + move_notation(move))
+            move = matches[0]
+        play_move(self.board, self.turn(), move, self.move_log, self.position)
+
+    def pop(self):              # takes back last move and returns its record; raises IndexError if no moves have been made; calls: retract_move
+        color_code = opposite_color(self.turn())
+        if self.move_log[color_code] == []:
+            raise IndexError('no moves to take back')
+        return retract_move(self.board, color_code, self.move_log, self.position)
+
+    def is_check(self):         # calls: check
+        king_position = list(self.position[self.turn()]['K'].keys())[0]
+        return check(self.turn(), self.position, king_position)
+
+    def outcome(self):          # None while game continues, else (result, reason), e.g. ('1-0', 'checkmate'); calls: game_outcome
+        reason = game_outcome(self.turn(), self.position, self.legal_move_table())
+        if reason == None:
+            return None
+        if reason == 'checkmate':
+            result = '0-1' if self.turn() == '*' else '1-0'
+        else: result = '1/2-1/2'
+        return (result, reason)
+
+    def perft(self, depth):     # calls: perft
+        return perft(self.board, self.turn(), self.position, self.move_log, depth)
+
+    def divide(self, depth):    # calls: divide
+        return divide(self.board, self.turn(), self.position, self.move_log, depth)
+
+    def pgn(self, tags={}):     # calls: move_log_pgn
+        return move_log_pgn(self.move_log, tags, self.start_fen)
+
+
+#---------------- search functions
+
+mate_score = 100000         # score of checkmate on the board; mates found further from root score less
+
+def move_key(move):         # identifies move in transposition table, killer and history tables
+    return (move.piece_code, move.start_square, move.move_square, move.promotion)
+
+class Search:       # computer player: negamax alpha-beta search with iterative deepening, quiescence search, transposition table, and MVV-LVA, killer and history move ordering
+    exact, lower_bound, upper_bound = 0, 1, 2       # kinds of transposition table scores
+    evasion_plies = 2       # quiescence plies in which all replies to check are searched; deeper, positions in check are scored like others
+    delta_margin = 200      # captures that cannot raise score to within this margin of alpha are not searched
+
+    def __init__(self, table_size=1 << 18, book=None):
+        self.book = book                    # OpeningBook whose moves are played while it has any for position
+        self.table_size = table_size
+        self.table = [None] * table_size    # transposition table: (zobrist key, depth, score, bound, best move key, generation) at index zobrist key % table_size
+        self.generation = 0                 # increased every search; entries from earlier searches are replaced first
+        self.history = {}                   # {(color_code, piece_code, move_square): score of quiet moves that caused cutoffs}
+
+    # searches game position to deeper and deeper depth until max_depth, time_limit (seconds) or node_limit is reached, or stop() is called from another thread
+    # returns best legal Move record of deepest search, with specifier, or move from book without searching; report(depth, score, nodes, seconds, principal variation) is called after each depth
+    # calls: OpeningBook.choose, legal_move_records, negamax, principal_variation
+    def best_move(self, game, max_depth=64, time_limit=None, node_limit=None, report=None):
+        root_moves = game.legal_moves()
+        if root_moves == []: return None
+        if self.book != None:
+            book_move = self.book.choose(game)
+            if book_move != None: return book_move
+        self.board, self.position, self.move_log = game.board, game.position, game.move_log
+        self.legal_moves_cache = LegalMovesCache()
+        self.start_time = time.perf_counter()
+        self.deadline = None if time_limit == None else self.start_time + time_limit
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.stopped = False
+        self.generation += 1
+        self.killers = [[None, None] for ply in range(max_depth + 1)]
+        self.history = {key: value // 8 for key, value in self.history.items()}    # history of earlier searches counts less
+        self.root_best = move_key(root_moves[0])
+        self.score = 0
+        self.depth = 0
+        for depth in range(1, max_depth + 1):
+            score = self.negamax(depth, -mate_score - 1, mate_score + 1, 0)
+            if self.stopped and depth > 1: break        # incomplete iteration; root_best only changes for moves searched completely
+            self.score = score
+            self.depth = depth
+            if report != None:
+                report(depth, score, self.nodes, time.perf_counter() - self.start_time, self.principal_variation(depth))
+            if self.stopped or abs(score) > mate_score - 1000: break        # mate found
+            if self.deadline != None and time.perf_counter() > self.start_time + (self.deadline - self.start_time) / 2:
+                break       # next depth would not finish in time
+        for move in root_moves:
+            if move_key(move) == self.root_best: return move
+
+    def stop(self):
+        self.stopped = True
+
+    def out_of_budget(self):
+        return ((self.node_limit != None and self.nodes >= self.node_limit) or
+                (self.deadline != None and time.perf_counter() >= self.deadline))
+
+    # moves in likely order of strength: transposition table move, captures by most valuable victim and least valuable attacker, promotions, killer moves, then quiet moves by history
+    def ordered_moves(self, moves, color_code, table_move, ply):
+        killers = self.killers[ply] if ply < len(self.killers) else ()        # quiescence search goes beyond depth of killer table
+        def ordering_score(move):
+            key = move_key(move)
+            if key == table_move: return 1000000
+            if move.capture_square_contents != '   ':
+                return 100000 + 10 * piece_family_dict[move.capture_square_contents[1]].value - piece_family_dict[move.piece_code if move.piece_code != 'O' else 'K'].value
+            if move.en_passant_capture != None: return 100000 + 900
+            if move.promotion != None: return 90000 + piece_family_dict[move.promotion].value
+            if key in killers: return 80000
+            return self.history.get((color_code, move.piece_code, move.move_square), 0)
+        return sorted(moves, key=ordering_score, reverse=True)
+
+    # score of position for side to move, searched depth moves deep; calls: quiescence, legal_moves, check, ordered_moves, move_piece, retract_move
+    def negamax(self, depth, alpha, beta, ply):
+        if depth == 0:
+            return self.quiescence(alpha, beta, ply, 0)
+        self.nodes += 1
+        if self.nodes % 256 == 0 and self.out_of_budget(): self.stopped = True
+        if self.stopped: return 0
+        board, position, move_log = self.board, self.position, self.move_log
+        color_code = position['turn']
+        key = position['zobrist']
+        if ply > 0 and (position['repetitions'][key] >= 3 or position['halfmove_clock'] >= 100):
+            return 0        # draw by repetition or fifty-move rule
+        table_index = key % self.table_size
+        entry = self.table[table_index]
+        table_move = None
+        if entry != None and entry[0] == key:
+            table_move = entry[4]
+            if entry[1] >= depth and ply > 0:
+                score = entry[2]
+                if score > mate_score - 1000: score -= ply          # mate scores are stored relative to position, used relative to root
+                elif score < 1000 - mate_score: score += ply
+                if (entry[3] == Search.exact or (entry[3] == Search.lower_bound and score >= beta) or
+                        (entry[3] == Search.upper_bound and score <= alpha)):
+                    return score
+        legal_moves = self.legal_moves_cache.legal_moves(board, color_code, position, move_log)
+        if legal_moves == {}:
+            king_position = list(position[color_code]['K'].keys())[0]
+            if check(color_code, position, king_position) == True: return ply - mate_score     # checkmate
+            return 0        # stalemate
+        original_alpha = alpha
+        best_score = -mate_score - 1
+        best_key = None
+        for move in self.ordered_moves(legal_move_records(board, color_code, legal_moves, False), color_code, table_move, ply):
+            move_piece(board, color_code, move, move_log, position)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            retract_move(board, color_code, move_log, position)
+            if self.stopped: return 0
+            if score > best_score:
+                best_score = score
+                best_key = move_key(move)
+                if ply == 0: self.root_best = best_key
+                if score > alpha: alpha = score
+                if alpha >= beta:
+                    if move.capture_square_contents == '   ' and move.en_passant_capture == None and move.promotion == None:     # quiet move
+                        if best_key != self.killers[ply][0]: self.killers[ply] = [best_key, self.killers[ply][0]]
+                        history_key = (color_code, move.piece_code, move.move_square)
+                        self.history[history_key] = self.history.get(history_key, 0) + depth * depth
+                    break
+        if best_score <= original_alpha: bound = Search.upper_bound
+        elif best_score >= beta: bound = Search.lower_bound
+        else: bound = Search.exact
+        if entry == None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:    # replaces entries of earlier searches or shallower depth
+            stored_score = best_score
+            if stored_score > mate_score - 1000: stored_score += ply
+            elif stored_score < 1000 - mate_score: stored_score -= ply
+            self.table[table_index] = (key, depth, stored_score, bound, best_key, self.generation)
+        return best_score
+
+    # score of position for side to move once captures and promotions have been played out, so that positions in the middle of an exchange are not evaluated
+    # side to move may stand pat on evaluation unless in check, when all legal moves are searched in first evasion_plies plies
+    # calls: check, legal_moves, legal_captures, evaluate, ordered_moves, move_piece, retract_move
+    def quiescence(self, alpha, beta, ply, quiescence_ply):
+        self.nodes += 1
+        if self.nodes % 256 == 0 and self.out_of_budget(): self.stopped = True
+        if self.stopped: return 0
+        board, position, move_log = self.board, self.position, self.move_log
+        color_code = position['turn']
+        king_position = list(position[color_code]['K'].keys())[0]
+        if quiescence_ply < Search.evasion_plies and check(color_code, position, king_position) == True:
+            legal_moves = self.legal_moves_cache.legal_moves(board, color_code, position, move_log)     # every legal move in check is an evasion
+            if legal_moves == {}: return ply - mate_score      # checkmate
+            best_score = -mate_score - 1
+            stand_pat = None
+        else:
+            best_score = stand_pat = evaluate(position, color_code)
+            if stand_pat >= beta: return stand_pat
+            if stand_pat > alpha: alpha = stand_pat
+            legal_moves = legal_captures(board, color_code, position, move_log)
+        for move in self.ordered_moves(legal_move_records(board, color_code, legal_moves, False), color_code, None, ply):
+            if move.promotion not in (None, 'Q') and stand_pat != None: continue       # underpromotions only matter as evasions
+            if stand_pat != None and move.promotion == None and move.capture_square_contents != '   ':
+                if stand_pat + piece_family_dict[move.capture_square_contents[1]].value + Search.delta_margin <= alpha: continue
+            move_piece(board, color_code, move, move_log, position)
+            score = -self.quiescence(-beta, -alpha, ply + 1, quiescence_ply + 1)
+            retract_move(board, color_code, move_log, position)
+            if self.stopped: return 0
+            if score > best_score:
+                best_score = score
+                if score > alpha: alpha = score
+                if alpha >= beta: break
+        return best_score
+
+    # moves expected by search from root, followed through transposition table; calls: legal_move_records, move_piece, retract_move
+    def principal_variation(self, depth):
+        board, position, move_log = self.board, self.position, self.move_log
+        variation = []
+        while len(variation) < depth:
+            entry = self.table[position['zobrist'] % self.table_size]
+            if entry == None or entry[0] != position['zobrist'] or entry[4] == None: break
+            color_code = position['turn']
+            legal_moves = legal_moves_func(board, color_code, position, move_log)
+            moves = [move for move in legal_move_records(board, color_code, legal_moves) if move_key(move) == entry[4]]
+            if moves == []: break
+            variation.append(moves[0])
+            move_piece(board, color_code, moves[0], move_log, position)
+        for move in reversed(variation):
+            retract_move(board, opposite_color(position['turn']), move_log, position)
+        return variation
+
+
+#---------------- perft functions
+
+perft_suite = [         # (position name, FEN, node counts at depth 1, 2, 3, ...); counts agree with independent move generators
+    ('starting position', starting_fen, [20, 400, 8902, 197281]),
+    ('Italian game', 'r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/2P2N2/PP1P1PPP/RNBQK2R w KQkq - 1 5', [34, 1187, 39687, 1368874]),
+    ('castling', 'r3kbnr/pppq1ppp/2n1p3/3p1b2/3P1B2/2N1P3/PPPQ1PPP/R3KBNR w KQkq - 0 6', [41, 1664, 66508, 2624916]),
+    ('en passant', 'rnbqkb1r/ppp1pppp/5n2/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3', [32, 898, 28312, 799610]),
+    ('promotion', 'rnbqkbnr/pppppp1P/8/8/8/8/PPPPPPP1/RNBQKBNR w KQkq - 1 5', [27, 529, 15489, 347754]),
+    ('check', 'rnbqkbnr/ppp1pppp/8/1B1p4/4P3/8/PPPP1PPP/RNBQK1NR b KQkq - 1 2', [5, 173, 3980, 135212]),
+    ('opera game', 'r3kb1r/p2nqppp/5n2/1B2p1B1/4P3/1Q6/PPP2PPP/R3K2R w KQkq - 1 12', [49, 1051, 48861, 1229360]),
+    ('Kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862, 4085603]),    # reference positions of chessprogramming.org
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467, 422333]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890, 3894594]),
+]
+
+# counts legal moves in legal_moves dictionary, one per promotion piece
+def count_moves(color_code, legal_moves):
+    last_rank = color_dict[opposite_color(color_code)]['back_rank'] - 1
+    count = 0
+    for piece_code, locations in legal_moves.items():
+        for targets in locations.values():
+            count += len(targets)
+            if piece_code == 'i':
+                count += 3 * len([move_square for move_square in targets if move_square // 8 == last_rank])    # 4 promotion pieces per move
+    return count
+
+# counts positions reached by all sequences of depth legal moves; calls: legal_moves_func, count_moves, legal_move_records, move_piece, retract_move
+def perft(board, color_code, current_position, move_log, depth):
+    if depth <= 0: return 1
+    legal_moves = legal_moves_func(board, color_code, current_position, move_log)
+    if depth == 1: return count_moves(color_code, legal_moves)
+    nodes = 0
+    for move in legal_move_records(board, color_code, legal_moves):
+        move_piece(board, color_code, move, move_log, current_position)
+        nodes += perft(board, opposite_color(color_code), current_position, move_log, depth - 1)
+        retract_move(board, color_code, move_log, current_position)
+    return nodes
+
+# perft split by first move: {'move notation': nodes}; calls: legal_moves_func, legal_move_records, move_notation, move_piece, perft, retract_move
+def divide(board, color_code, current_position, move_log, depth):
+    legal_moves = legal_moves_func(board, color_code, current_position, move_log)
+    root_nodes = {}
+    for move in legal_move_records(board, color_code, legal_moves):
+        move_piece(board, color_code, move, move_log, current_position)
+        root_nodes[move_notation(move)] = perft(board, opposite_color(color_code), current_position, move_log, depth - 1)
+        retract_move(board, color_code, move_log, current_position)
+    return root_nodes
+
+# runs perft on suite positions up to max_depth and reports node counts and nodes per second; returns False if any count is wrong
+# workers > 1 splits each perft among worker processes; calls: Game, parallel_perft
+def run_perft_suite(max_depth=3, workers=1):
+    passed = True
+    total_nodes = 0
+    total_time = 0
+    executor = worker_pool(workers) if workers > 1 else None
+    for name, fen, node_counts in perft_suite:
+        game = Game(fen)
+        for depth, expected_nodes in enumerate(node_counts[:max_depth], 1):
+            start_time = time.perf_counter()
+            if executor == None: nodes = game.perft(depth)
+            else: nodes = parallel_perft(game, depth, executor)
+            elapsed = time.perf_counter() - start_time
+            total_nodes += nodes
+            total_time += elapsed
+            if nodes != expected_nodes: passed = False
+            print('%-18s depth %d: %9d nodes %-18s %7.2f s %9.0f nodes/s'
+                  % (name, depth, nodes, 'ok' if nodes == expected_nodes else 'EXPECTED %d' % (expected_nodes,), elapsed, nodes / max(elapsed, 1e-9)))
+    if executor != None: executor.shutdown()
+    print('%d nodes in %.2f s: %.0f nodes/s%s' % (total_nodes, total_time, total_nodes / max(total_time, 1e-9), '' if passed else '; SOME NODE COUNTS ARE WRONG'))
+    return passed
+
+
+#---------------- parallel analysis functions
+# results are merged in task order, so output does not depend on the number of workers
+
+def init_worker(core):      # gives worker process the position core of the parent process
+    global position_core
+    position_core = core
+
+def worker_pool(workers=None):      # process pool for parallel_divide and analyze_positions; workers = None uses all cores
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(position_core,))
+
+# maps function over tasks lazily, in this process when there is no executor; results are in task order either way
+# with executor, no more than window tasks are submitted ahead of results taken, so long streams of tasks use constant memory
+def pool_map(executor, function, tasks, window=256):
+    if executor == None:
+        yield from map(function, tasks)
+        return
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(executor.submit(function, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def game_after(position):   # game at position given as FEN, or as moves in notation from starting position; calls: Game
+    if isinstance(position, str): return Game(position)
+    game = Game()
+    for move in position:
+        game.push(move)
+    return game
+
+def perft_task(task):       # task = (board, position, depth) copied from game; calls: perft
+    board, current_position, depth = task
+    return perft(board, current_position['turn'], current_position, {'*': [], '-': []}, depth)
+
+# divide of game position with perft after each reply to each first move run as a separate task, so work is spread evenly among workers
+# calls: save_position, pool_map, perft_task
+def parallel_divide(game, depth, executor=None):
+    root_nodes = {}
+    task_roots = []
+    tasks = []
+    for root_move in game.legal_moves():
+        root = move_notation(root_move)
+        root_nodes[root] = 0
+        game.push(root_move)
+        if depth >= 3:
+            for reply in game.legal_moves():
+                game.push(reply)
+                task_roots.append(root)
+                tasks.append((list(game.board), save_position(game.position), depth - 2))
+                game.pop()
+        else:
+            task_roots.append(root)
+            tasks.append((list(game.board), save_position(game.position), depth - 1))
+        game.pop()
+    for root, nodes in zip(task_roots, pool_map(executor, perft_task, tasks)):
+        root_nodes[root] += nodes
+    return root_nodes
+
+def parallel_perft(game, depth, executor=None):     # calls: parallel_divide
+    if depth <= 0: return 1
+    return sum(parallel_divide(game, depth, executor).values())
+
+def analysis_task(task):    # task = (position, depth); calls: game_after, count_moves, perft
+    position, depth = task
+    game = game_after(position)
+    outcome = game.outcome()
+    return {'fen': game.fen(),
+            'legal_moves': count_moves(game.turn(), game.legal_move_table()),
+            'check': game.is_check(),
+            'outcome': None if outcome == None else outcome[1],
+            'perft': game.perft(depth) if depth > 0 else None}
+
+# analyzes each position, given as FEN or list of moves, and returns list of analysis dictionaries in order of positions; calls: pool_map, analysis_task
+def analyze_positions(positions, depth=0, executor=None):
+    return list(pool_map(executor, analysis_task, [(position, depth) for position in positions]))
+
+
+#---------------- game log replay functions
+# log files are streamed through generators one line and one game at a time, so memory use does not grow with number or size of files
+
+def log_files(paths):       # paths of log files, with .txt and .pgn files of directories in name order
+    for path in paths:
+        if os.path.isdir(path):
+            yield from log_files(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(('.txt', '.pgn'))))
+        else: yield path
+
+def log_lines(paths):       # (path, line number, line) for each line of log files; calls: log_files
+    for path in log_files(paths):
+        with open(path) as log_file:
+            for line_number, line in enumerate(log_file, 1):
+                yield (path, line_number, line)
+
+# groups lines of move logs written by save_game into games: ('path:line', [moves]); a game ends where its file ends or move numbers start again at 1
+def log_games(lines):
+    source = None
+    game_path = None
+    moves = []
+    for path, line_number, line in lines:
+        fields = line.split()
+        if fields == []: continue
+        if fields[0].endswith(':') and fields[0][:-1].isdigit():     # move number
+            new_game = fields[0] == '1:'
+            fields = fields[1:]
+        else: new_game = False
+        if path != game_path or (new_game == True and moves != []):
+            if source != None: yield (source, moves)
+            source = '%s:%d' % (path, line_number)
+            game_path = path
+            moves = []
+        moves.extend(fields)
+    if source != None: yield (source, moves)
+
+# replays game from log and reports first illegal move, final position and result; task = (source, moves, FEN of starting position or None); calls: Game
+def replay_game(task):
+    source, moves, fen = task
+    try:
+        game = Game(fen)
+    except ValueError:
+        return {'source': source, 'moves': 0, 'error': 'starting position is not valid FEN', 'position': fen, 'result': '*'}
+    error = None
+    for move in moves:
+        try:
+            game.push(move)
+        except ValueError:
+            error = 'move %d (%s): %s is not legal' % (game.fullmove_number(), color_dict[game.turn()]['color'], move)
+            break
+    outcome = game.outcome()
+    return {'source': source,
+            'moves': len(game.move_log['*']) + len(game.move_log['-']),
+            'error': error,
+            'position': game.fen(),
+            'result': '*' if outcome == None else '%s (%s)' % outcome}
+
+# games of move logs and PGN files: ('path:line' or 'path#game number', [moves], FEN of starting position or None); calls: log_files, log_games, log_lines, PgnReader, parse_pgn
+def logged_games(paths):
+    for path in log_files(paths):
+        if path.endswith('.pgn'):
+            pgn_reader = PgnReader(path)
+            for game_number in range(len(pgn_reader)):
+                tags, moves, result = parse_pgn(pgn_reader.game_text(game_number))
+                yield ('%s#%d' % (path, game_number + 1), moves, tags.get('FEN'))
+            pgn_reader.close()
+        else:
+            for source, moves in log_games(log_lines([path])):
+                yield (source, moves, None)
+
+# replays every game in log files, PGN files, or directories of them, and yields replay reports in order of games; calls: logged_games, pool_map, replay_game
+def replay_logs(paths, executor=None):
+    return pool_map(executor, replay_game, logged_games(paths))
+
+
+#---------------- PGN functions
+
+pgn_tag_roster = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result']     # tags required by PGN standard, in standard order
+
+pgn_token_pattern = re.compile(r'''\[\s*(\w+)\s*"((?:[^"\\]|\\.)*)"\s*\]     # tag pair
+                                   |\{[^}]*\}|;[^\n]*|\$\d+|\d+\.+           # comment, NAG, move number
+                                   |(\(|\))                                       # start or end of variation
+                                   |(1-0|0-1|1/2-1/2|\*)(?=\s|$)                  # result
+                                   |([^\s{}();\[\]]+)                             # move''', re.VERBOSE)
+
+pgn_game_start = re.compile(rb'(?:\A|\n[ \t\r]*\n)\s*(?=\S)')      # game starts file or follows blank line, with tag section or, in games without tags, movetext
+pgn_result_end = re.compile(rb'\s(?:1-0|0-1|1/2-1/2|\*)[ \t\r]*\Z')   # result ends previous game, so movetext after blank line starts game without tags
+
+# moves of move_log in order of play
+def move_sequence(move_log, first_color='*'):
+    second_color = opposite_color(first_color)
+    moves = []
+    for move_number in range(len(move_log[first_color])):
+        moves.append(move_log[first_color][move_number])
+        if move_number < len(move_log[second_color]): moves.append(move_log[second_color][move_number])
+    return moves
+
+# writes game played from starting position, or from FEN, in PGN: seven tag roster (with values from tags or defaults) followed by other tags and SAN movetext
+# calls: Game, move_sequence
+def move_log_pgn(move_log, tags={}, fen=None):
+    game = Game(fen)        # replayed to find check and mate marks
+    movetext = []
+    for move in move_sequence(move_log, game.turn()):
+        if game.turn() == '*': movetext.append('%d.' % (game.fullmove_number(),))
+        elif movetext == []: movetext.append('%d...' % (game.fullmove_number(),))      # game starts with black's move
+        game.push(move.notation)
+        outcome = game.outcome()
+        if outcome != None and outcome[1] == 'checkmate': movetext.append(move.notation + '#')
+        elif game.is_check() == True: movetext.append(move.notation + '+')
+        else: movetext.append(move.notation)
+    outcome = game.outcome()
+    tags = dict({'Event': 'Casual game', 'Site': '?', 'Date': time.strftime('%Y.%m.%d'), 'Round': '-', 'White': '?', 'Black': '?',
+                 'Result': '*' if outcome == None else outcome[0]}, **tags)
+    if fen != None: tags.update({'SetUp': '1', 'FEN': fen})
+    tag_order = pgn_tag_roster + [tag for tag in tags if tag not in pgn_tag_roster]
+    tag_section = ''.join('[%s "%s"]\n' % (tag, tags[tag].replace('\\', '\\\\').replace('"', '\\"')) for tag in tag_order)
+    movetext.append(tags['Result'])
+    return tag_section + '\n' + textwrap.fill(' '.join(movetext), 79) + '\n\n'
+
+# reads first game of PGN text: returns ({tag: value}, [moves in SAN], result); comments, NAGs and variations are skipped
+def parse_pgn(text):
+    tags = {}
+    moves = []
+    result = '*'
+    variation_depth = 0
+    for token in pgn_token_pattern.finditer(text):
+        tag, value, variation, game_result, move = token.groups()
+        if tag != None:
+            if moves != []: break           # tag section of next game
+            tags[tag] = re.sub(r'\\(.)', r'\1', value)
+        elif variation == '(': variation_depth += 1
+        elif variation == ')': variation_depth -= 1
+        elif variation_depth > 0: continue
+        elif game_result != None:
+            result = game_result
+            break
+        elif move != None: moves.append(move.replace('0', 'O') if move.startswith('0-0') else move)     # castling is sometimes written with zeros
+    return (tags, moves, result)
+
+# reads first game of PGN text into Game, starting from position of its FEN tag if it has one; raises ValueError, naming move, for illegal moves or FEN; calls: parse_pgn, Game
+def pgn_game(text):
+    tags, moves, result = parse_pgn(text)
+    game = Game(tags.get('FEN'))
+    for move in moves:
+        try:
+            game.push(move)
+        except ValueError:
+            raise ValueError('move %d (%s): %s is not legal' % (game.fullmove_number(), color_dict[game.turn()]['color'], move))
+    return game, tags
+
+class PgnReader:        # memory-maps PGN file and indexes byte offsets of games, so any game or range of games is read without parsing those before it
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.offsets = array.array('q')     # byte offset of each game
+        self.map = b''
+        if os.path.getsize(path) > 0:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            for match in pgn_game_start.finditer(self.map):
+                if self.map[match.end():match.end() + 1] == b'[' or match.start() == 0 or pgn_result_end.search(self.map, max(0, match.start() - 16), match.start()) != None:
+                    self.offsets.append(match.end())        # blank lines within game, e.g. after tag section, are skipped
+        self.offsets.append(len(self.map))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def game_text(self, game_number):       # PGN text of game (numbered from 0)
+        if not 0 <= game_number < len(self):
+            raise IndexError('no game %d in PGN file' % (game_number,))
+        return self.map[self.offsets[game_number]:self.offsets[game_number + 1]].decode('utf-8', 'replace')
+
+    def games(self, start=0, stop=None):    # yields (tags, moves, result) of games start to stop; calls: parse_pgn
+        for game_number in range(start, len(self) if stop == None else min(stop, len(self))):
+            yield parse_pgn(self.game_text(game_number))
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap): self.map.close()
+        self.file.close()
+
+
+#---------------- opening book functions
+# book file is an array of fixed-size entries sorted by zobrist key, searched by binary search in memory-mapped file, so book is never loaded into memory
+
+book_entry = struct.Struct('>QHH')      # zobrist key of position, move code, number of games in which move was played (at most 65535)
+book_promotions = (None, 'N', 'B', 'R', 'Q')
+
+def book_move_code(move):       # start square + 64 * move square + 4096 * index of promotion piece in book_promotions
+    return move.start_square + 64 * move.move_square + 4096 * book_promotions.index(move.promotion)
+
+# {(zobrist key, move code)} of moves of game up to first illegal move, each once however often position repeats, so book counts games; task = (source, moves, FEN of starting position or None); calls: Game, book_move_code
+def book_game(task):
+    source, moves, fen = task
+    book_moves = set()
+    try:
+        game = Game(fen)
+        for move in moves:
+            move = game.parse_move(move)
+            book_moves.add((game.position['zobrist'], book_move_code(move)))
+            game.push(move)
+    except ValueError:
+        pass
+    return book_moves
+
+# counts moves played in first max_plies plies of every game in log files, PGN files, or directories of them, and writes book to book_path
+# returns number of entries written; calls: logged_games, pool_map, book_game
+def build_book(paths, book_path, max_plies=16, executor=None):
+    counts = collections.Counter()          # {(zobrist key, move code): games}
+    for book_moves in pool_map(executor, book_game, ((source, moves[:max_plies], fen) for source, moves, fen in logged_games(paths))):
+        counts.update(book_moves)
+    book_file = open(book_path, 'wb')
+    for (key, move_code), games in sorted(counts.items()):
+        book_file.write(book_entry.pack(key, move_code, min(games, 65535)))
+    book_file.close()
+    return len(counts)
+
+class OpeningBook:      # memory-maps book written by build_book; moves are chosen in proportion to weight with generator seeded with seed, so same seed repeats same choices
+    def __init__(self, path, seed=0):
+        self.file = open(path, 'rb')
+        self.map = b''
+        if os.path.getsize(path) > 0:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.random = random.Random(seed)
+
+    def __len__(self):
+        return len(self.map) // book_entry.size
+
+    def entries(self, key):     # [(move code, weight)] of position with zobrist key
+        low = 0
+        high = len(self)
+        while low < high:           # finds first entry with key
+            middle = (low + high) // 2
+            if book_entry.unpack_from(self.map, middle * book_entry.size)[0] < key: low = middle + 1
+            else: high = middle
+        entries = []
+        for index in range(low, len(self)):
+            entry_key, move_code, weight = book_entry.unpack_from(self.map, index * book_entry.size)
+            if entry_key != key: break
+            entries.append((move_code, weight))
+        return entries
+
+    def moves(self, game):      # [(legal Move record, weight)] of book moves in position of game; calls: entries, book_move_code
+        weights = dict(self.entries(game.position['zobrist']))
+        if weights == {}: return []
+        return [(move, weights[book_move_code(move)]) for move in game.legal_moves() if book_move_code(move) in weights]
+
+    def choose(self, game):     # book move for position of game, or None if book has none; calls: moves
+        moves = self.moves(game)
+        if moves == []: return None
+        return self.random.choices([move for move, weight in moves], [weight for move, weight in moves])[0]
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap): self.map.close()
+        self.file.close()
+
+
+#---------------- UCI functions
+
+uci_clock_moves = 30        # moves the remaining clock time is shared between when GUI does not send movestogo
+
+def uci_score(score):       # score of search as UCI reports it: centipawns, or moves to mate (negative when getting mated)
+    if score > mate_score - 1000: return 'mate %d' % ((mate_score - score + 1) // 2)
+    if score < 1000 - mate_score: return 'mate %d' % -((mate_score + score) // 2)
+    return 'cp %d' % score
+
+# search limits of go command: (max_depth, time_limit, node_limit, infinite); time limit in seconds comes from movetime, or from clock of side to move
+def uci_limits(words, color_code):
+    settings = {}
+    for index, word in enumerate(words[:-1]):
+        if word in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'depth', 'nodes', 'movetime') and words[index + 1].lstrip('-').isdigit():
+            settings[word] = int(words[index + 1])
+    time_limit = None
+    clock, increment = ('wtime', 'winc') if color_code == '*' else ('btime', 'binc')
+    if 'movetime' in settings:
+        time_limit = settings['movetime'] / 1000
+    elif clock in settings:
+        share = settings[clock] / max(settings.get('movestogo', uci_clock_moves), 1) + settings.get(increment, 0) / 2
+        time_limit = max(min(share, settings[clock] / 2), 1) / 1000      # never more than half the clock
+    return (settings.get('depth', 64), time_limit, settings.get('nodes'), 'infinite' in words)
+
+# plays the engine over the UCI protocol, reading commands from input_lines until quit
+# search runs on a worker thread, so that stop, isready and quit are answered while it thinks
+# calls: Game, Search, uci_limits, uci_score, uci_notation
+def uci_loop(input_lines=sys.stdin, book=None):
+    game = Game()
+    search = Search(book=book)
+    search_thread = None
+    output_lock = threading.Lock()
+    stop_signal = threading.Event()
+
+    def send(line):
+        with output_lock:
+            print(line, flush=True)
+
+    def report(depth, score, nodes, seconds, variation):
+        send('info depth %d score %s nodes %d nps %d time %d pv %s' % (depth, uci_score(score), nodes, nodes / max(seconds, 0.001),
+                                                                        seconds * 1000, ' '.join(uci_notation(move) for move in variation)))
+
+    def think(game, max_depth, time_limit, node_limit, infinite):       # runs on search_thread; bestmove is sent even if search fails, so GUI never waits for it
+        played_moves = len(game.move_log['*']) + len(game.move_log['-'])
+        move = None
+        try:
+            move = search.best_move(game, max_depth, time_limit, node_limit, report)
+        except Exception as error:
+            send('info string search failed: %r' % (error,))
+        finally:
+            while len(game.move_log['*']) + len(game.move_log['-']) > played_moves:
+                game.pop()      # takes back moves search left on board
+            if infinite == True: stop_signal.wait()         # bestmove of go infinite is only sent after stop
+            send('bestmove ' + (uci_notation(move) if move != None else '0000'))
+
+    def stop_search():
+        stop_signal.set()
+        while search_thread != None and search_thread.is_alive():
+            search.stop()       # repeated in case search had not yet started
+            search_thread.join(0.01)
+
+    for line in input_lines:
+        words = line.split()
+        command = words[0] if words != [] else ''
+        if command == 'uci':
+            send('id name cmd_line_chess')
+            send('id author nathanedison')
+            send('uciok')
+        elif command == 'isready':
+            send('readyok')
+        elif command == 'ucinewgame':
+            stop_search()
+            game = Game()
+            search = Search(book=book)
+        elif command == 'position':
+            stop_search()
+            moves_index = words.index('moves') if 'moves' in words else len(words)
+            try:
+                new_game = Game(' '.join(words[2:moves_index]) if words[1:2] == ['fen'] else None)
+                for move in words[moves_index + 1:]:
+                    new_game.push(move)
+                game = new_game         # earlier position is kept unless whole command is valid
+            except (ValueError, IndexError, KeyError) as error:
+                send('info string invalid position: %s' % error)
+        elif command == 'go':
+            stop_search()
+            stop_signal.clear()
+            search_thread = threading.Thread(target=think, args=(game,) + uci_limits(words, game.turn()), daemon=True)
+            search_thread.start()
+        elif command == 'stop':
+            stop_search()
+        elif command == 'quit':
+            break
+    stop_search()
+
+#---------------- profiling functions
+# instrumentation is off unless start_profiling is called: it then replaces hot functions in module namespace with counting wrappers, which stop_profiling removes
+# every call is counted, but time and memory of recursive calls are counted once, by outermost call, so time per call is time per outermost call; nested calls to other profiled functions are included in caller's time, as in cumulative time of cProfile
+# memory is change in number of blocks held by interpreter (sys.getallocatedblocks) across each call: blocks call left allocated less blocks it freed, not number of allocations it made
+
+profiled_functions = ('legal_moves_func', 'legal_captures', 'move_piece', 'update_position', 'slider_scope', 'evaluate_squares', 'check', 'iter_tree')
+profile_counts = {}         # {function name: [calls, outermost calls, seconds, change in allocated memory blocks]}
+unprofiled_functions = {}   # {function name: original function} while profiling
+
+def profiled(name, function):       # wrapper of function that adds to profile_counts[name]; generator functions are timed while they produce items
+    counts = profile_counts.setdefault(name, [0, 0, 0.0, 0])
+    active_calls = [0]      # calls of function in progress, so recursive calls are not counted twice
+    if inspect.isgeneratorfunction(function):
+        def profiled_generator(*args, **kwargs):
+            counts[0] += 1
+            if active_calls[0] == 0: counts[1] += 1     # generators made while another is producing an item are recursive calls
+            generator = function(*args, **kwargs)
+            while True:
+                outermost = active_calls[0] == 0
+                active_calls[0] += 1
+                start_time = time.perf_counter()
+                start_blocks = sys.getallocatedblocks()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    active_calls[0] -= 1
+                    if outermost == True:
+                        counts[2] += time.perf_counter() - start_time
+                        counts[3] += sys.getallocatedblocks() - start_blocks
+                yield item
+        return profiled_generator
+    def profiled_function(*args, **kwargs):
+        counts[0] += 1
+        if active_calls[0] > 0:
+            return function(*args, **kwargs)
+        counts[1] += 1
+        active_calls[0] = 1
+        start_time = time.perf_counter()
+        start_blocks = sys.getallocatedblocks()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            active_calls[0] = 0
+            counts[2] += time.perf_counter() - start_time
+            counts[3] += sys.getallocatedblocks() - start_blocks
+    return profiled_function
+
+def start_profiling(names=profiled_functions):      # clears counts and wraps functions named in names; calls: profiled
+    profile_counts.clear()
+    for name in names:
+        if name not in unprofiled_functions:
+            unprofiled_functions[name] = globals()[name]
+            globals()[name] = profiled(name, unprofiled_functions[name])
+
+def stop_profiling():       # puts original functions back; counts are kept for profile_report
+    for name, function in unprofiled_functions.items():
+        globals()[name] = function
+    unprofiled_functions.clear()
+
+def profile_report(wall_seconds=None):      # counts of profiled functions, most time first, in form written to JSON report
+    functions = {}
+    for name, (calls, outermost_calls, seconds, blocks) in sorted(profile_counts.items(), key=lambda item: -item[1][2]):
+        functions[name] = {'calls': calls, 'outermost_calls': outermost_calls, 'seconds': round(seconds, 6),
+                           'microseconds_per_call': round(seconds / outermost_calls * 1000000, 3) if outermost_calls > 0 else 0, 'allocated_blocks_change': blocks}
+    return {'command': sys.argv, 'python': sys.version.split()[0], 'position_core': position_core, 'wall_seconds': wall_seconds, 'functions': functions}
+
+# prints summary of report to standard error, where it does not mix with output of UCI or replay, and writes report to json_path
+def write_profile_report(report, json_path):
+    lines = ['%-18s %10s %10s %10s %14s %14s' % ('function', 'calls', 'outermost', 'seconds', 'us per call', 'blocks change')]
+    for name, counts in report['functions'].items():
+        lines.append('%-18s %10d %10d %10.3f %14.2f %14d' % (name, counts['calls'], counts['outermost_calls'], counts['seconds'], counts['microseconds_per_call'],
+                                                       counts['allocated_blocks_change']))
+    if report['wall_seconds'] != None: lines.append('%.3f s in all' % (report['wall_seconds'],))
+    print('\n'.join(lines), file=sys.stderr)
+    report_file = open(json_path, 'w')
+    json.dump(report, report_file, indent=1)
+    report_file.write('\n')
+    report_file.close()
+
+
+#---------------- benchmark functions
+
+opera_game = '''e4 e5 Nf3 d6 d4 Bg4 dxe5 Bxf3 Qxf3 dxe5 Bc4 Nf6 Qb3 Qe7 Nc3 c6 Bg5 b5 Nxb5 cxb5
+Bxb5 Nbd7 O-O-O Rd8 Rxd7 Rxd7 Rd1 Qe6 Bxd7 Nxd7 Qb8 Nxb8 Rd8'''.split()     # Morphy - Duke of Brunswick and Count Isouard, Paris 1858
+
+# measures memory held by a 200-ply move log and memory allocated per generated move; calls: arrange_board, legal_moves_func, execute_move
+def benchmark_move_records(plies=200):
+    board, current_position = arrange_board()
+    move_log = {'*': [], '-': []}
+    color_code = '*'
+    knight_moves = ['Nf3', 'Nf6', 'Ng1', 'Ng8']
+    for ply in range(plies):            # knights move out and back to build a long log
+        legal_moves = legal_moves_func(board, color_code, current_position, move_log)
+        execute_move(board, color_code, knight_moves[ply % 4], legal_moves, move_log, [], current_position)
+        color_code = opposite_color(color_code)
+    moves = move_log['*'] + move_log['-']
+    record_bytes = sum(sys.getsizeof(move) + sys.getsizeof(move.previous_state) for move in moves)
+    dict_bytes = sum(sys.getsizeof({slot: getattr(move, slot) for slot in Move.__slots__}) + sys.getsizeof(move.previous_state) for move in moves)
+    print('%d-ply move log: %d bytes in Move records (%d bytes as dictionaries with the same keys)' % (plies, record_bytes, dict_bytes))
+
+    board, current_position = arrange_board()
+    move_log = {'*': [], '-': []}
+    color_code = '*'
+    generated_moves = 0
+    peak_bytes = 0
+    start_time = time.perf_counter()
+    tracemalloc.start()
+    for chosen_move in opera_game:
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        legal_moves = legal_moves_func(board, color_code, current_position, move_log)
+        peak_bytes += tracemalloc.get_traced_memory()[1] - start_bytes
+        generated_moves += len([move for indexes, move in iter_tree(legal_moves)])
+        execute_move(board, color_code, chosen_move, legal_moves, move_log, [], current_position)
+        color_code = opposite_color(color_code)
+    tracemalloc.stop()
+    elapsed = time.perf_counter() - start_time
+    print('%d legal moves generated in %d positions: %.0f bytes allocated per move at peak, %.1f microseconds per move (traced)'
+          % (generated_moves, len(opera_game), peak_bytes / generated_moves, elapsed / generated_moves * 1000000))
+
+# measures cost of evaluation per node, reading score kept by update_position against calculating it from scratch, and speed of search using it
+# calls: Game, evaluate, evaluation_score, Search
+def benchmark_evaluation(calls=20000, search_nodes=5000):
+    game = Game()
+    positions = []
+    for chosen_move in opera_game:
+        game.push(chosen_move)
+        positions.append(save_position(game.position))
+    timings = []
+    for evaluation in (lambda position: evaluate(position, position['turn']), lambda position: evaluation_score(position)):
+        start_time = time.perf_counter()
+        for call in range(calls // len(positions)):
+            for position in positions:
+                evaluation(position)
+        timings.append((time.perf_counter() - start_time) / (calls // len(positions) * len(positions)) * 1000000)
+    print('evaluation: %.2f microseconds per node from incrementally updated score, %.2f microseconds per node calculated from scratch' % tuple(timings))
+    game = Game('r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4')
+    search = Search()
+    start_time = time.perf_counter()
+    search.best_move(game, node_limit=search_nodes)
+    elapsed = time.perf_counter() - start_time
+    print('search: %d nodes in %.2f s: %.0f nodes/s, depth %d' % (search.nodes, elapsed, search.nodes / elapsed, search.depth))
+
+# measures cost of generating legal captures and promotions against generating all legal moves, in positions of opera_game; calls: Game, legal_moves_func, legal_captures
+def benchmark_captures(rounds=20):
+    game = Game()
+    positions = []
+    for chosen_move in opera_game:
+        positions.append((list(game.board), game.turn(), save_position(game.position)))
+        game.push(chosen_move)
+    timings = []
+    for generator in (legal_moves_func, legal_captures):
+        start_time = time.perf_counter()
+        for round in range(rounds):
+            for board, color_code, current_position in positions:
+                generator(board, color_code, current_position, {'*': [], '-': []})
+        timings.append((time.perf_counter() - start_time) / (rounds * len(positions)) * 1000000)
+    print('move generation: %.0f microseconds per position for all legal moves, %.0f for captures and promotions only (%.0f%%)'
+          % (timings[0], timings[1], timings[1] / timings[0] * 100))
+
 # -------------------- primary game-play function
 
-def play_game(file_path, silent_mode):    # calls: arrange_board, display_board, legal_moves_func, mate_check_draw
-    game_board, current_position = arrange_board()
-    color_code = '*'                    # sets first turn to white
-    move_log = {'*': [], '-': []}       # {'color_code': ['piece_code', 'piece_square', 'move_square', 'captured_piece', 'capture_square']}
+def play_game(file_path, silent_mode, computer_color=None, move_time=5, book=None):    # command-prompt front end to Game; computer plays computer_color, if given, from book while it has moves; calls: BoardRenderer, mate_check_draw, execute_move, game_options, play_move
+    game = Game()
+    computer = Search(book=book)
+    board_renderer = BoardRenderer()        # redraws only rows changed since last turn
+    game_board, current_position, move_log = game.board, game.position, game.move_log
     redo_move_log = []
     chosen_move = ''
     game_state = 0                # 0 = turn not complete, do not proceed to next turn; 1 = finish turn and go to next turn; -1 = game over
     if file_path == '': move_seq = []   # no game to restore, continue with normal gameplay
     else:                               # game is being restored
         game_file = open(file_path)
-        log_file = [i.split()[1:] for i in list(game_file)] # captures each pair of moves in the log file as a second-dimension list of 2, removing the move number 
+        if file_path.endswith('.pgn'):
+            move_seq = parse_pgn(game_file.read())[1]
+        else:
+            log_file = [i.split()[1:] for i in list(game_file)] # captures each pair of moves in the log file as a second-dimension list of 2, removing the move number 
+            move_seq = list(itertools.chain.from_iterable(log_file)) # combines all moves into one continuous sequence
         game_file.close()
-        move_seq = list(itertools.chain.from_iterable(log_file)) # combines all moves into one continuous sequence
     while game_state > -1:       # loop until game is over
+        color_code = game.turn()
         if silent_mode == False:    # keep updating display
-            display_board(game_board, color_code, move_log)
-            if len(move_log['*']) > 0:  # if previous moves exist
-                last_move = display_move_log(move_log).split()[-1]
-                print(last_move, '\n')
-        legal_moves = legal_moves_func(game_board, color_code, current_position, move_log)         #legal_moves: {'piece_code': {'location': ['moves', 'for', 'this', 'piece']}
+            board_renderer.display(game_board, color_code, move_log)
+            if len(move_log[opposite_color(color_code)]) > 0:  # if previous moves exist
+                print(move_log[opposite_color(color_code)][-1].notation, '\n')       # last move
+        legal_moves = game.legal_move_table()         #legal_moves: {'piece_code': {'location': ['moves', 'for', 'this', 'piece']}
+        plies_played = len(move_log['*']) + len(move_log['-'])     # compared after the turn to detect an undo, whether from the move prompt or the end-of-game options
         game_state = mate_check_draw(game_board, color_code, silent_mode, current_position,
                                         legal_moves, move_log, redo_move_log)
         auto_move_attempt = 0
@@ -766,8 +2349,14 @@ def play_game(file_path, silent_mode):    # calls: arrange_board, display_board,
                 else:                           # stops restore when unsuccessful move attempted
                     del move_seq[:]
                     slient_mode = False
-                    display_board(game_board, color_code, move_log)
+                    board_renderer.display(game_board, color_code, move_log)
                     continue
+            elif color_code == computer_color:
+                print('The computer is thinking...')
+                play_move(game_board, color_code, computer.best_move(game, time_limit=move_time), move_log, current_position)
+                del redo_move_log[:]
+                game_state = 1
+                continue
             else:
                 print("It's " + color_dict[color_code]['color'] + "'s turn to move. Please enter your move. For more instructions type i.")     #initial move instructions in normal play
                 chosen_move = input()
@@ -775,33 +2364,158 @@ def play_game(file_path, silent_mode):    # calls: arrange_board, display_board,
                 game_state = game_options(game_board, color_code, chosen_move, move_log, redo_move_log, current_position)      # option entered instead of move
             else:
                 game_state = execute_move(game_board, color_code, chosen_move, legal_moves, move_log, redo_move_log, current_position)
-        color_code = opposite_color(color_code)                     #sets next turn to opposite color
-
+        if game_state == 1 and len(move_log['*']) + len(move_log['-']) < plies_played and game.turn() == computer_color and move_log[opposite_color(computer_color)] != []:
+            undo_move(game_board, opposite_color(computer_color), move_log, redo_move_log, current_position)     # takes back player's move as well as computer's
+            chosen_move = ''
+
+
+command_line_usage = '''
+python3 cmd_line_chess.py                           play on the command prompt
+python3 cmd_line_chess.py --benchmark               measure memory of move records and cost of evaluation
+python3 cmd_line_chess.py --perft [depth]           check perft node counts of suite positions (default depth 3) and report nodes per second
+python3 cmd_line_chess.py --divide depth [FEN] [moves]  perft split by first move from position after moves, e.g. --divide 3 e4 e5
+python3 cmd_line_chess.py --analyze file [depth]    legal moves, check, outcome and perft (default depth 0 = none) of FEN, or position after moves, on each line of file
+python3 cmd_line_chess.py --replay path [path ...]  check every game in saved log files, PGN files, or directories of them; a file can hold many games one after another
+python3 cmd_line_chess.py --pgn file [first [last]] print games first to last (numbered from 1) of PGN file, checked and rewritten; games with illegal moves are reported instead
+python3 cmd_line_chess.py --uci                     play as engine of a chess GUI or tournament manager over the UCI protocol
+python3 cmd_line_chess.py --build-book book path [path ...]  write opening book of first 16 plies of games in log files, PGN files, or directories of them
+    --profile file  with any mode: count calls, time and change in allocated memory blocks of move generation functions, print summary at exit and write it to file as JSON
+                    (only work done in main process is counted, so use with --workers 1)
+    --workers n     with --perft, --divide, --analyze, --replay or --build-book: number of worker processes (0 = one per core; default 1)
+    --book file     with --uci, or on command prompt: computer plays moves from opening book while it has any
+CHESS_TABLE_CACHE=file  environment variable naming a file in which slider attack tables are kept between sessions
+'''
 
-mode = ''
-while mode != 'x':  # x = terminate the program
-    print('''
-To start a new game, type n. To restore a game, type r.
-For game instructions, type i. To exit, type x.''')
-    mode = input()
-    if mode == 'i':     # show instructions
-        print(instructions)
-    elif mode == 'r':   # restore game
+def main():         # command-prompt menu, or other modes listed in command_line_usage
+    options = sys.argv[1:]
+    workers = 1
+    if '--workers' in options[:-1]:
+        option_index = options.index('--workers')
+        workers = int(options[option_index + 1]) or os.cpu_count()
+        del options[option_index:option_index + 2]
+    book = None
+    if '--book' in options[:-1]:
+        option_index = options.index('--book')
+        book = OpeningBook(options[option_index + 1])
+        del options[option_index:option_index + 2]
+    if '--profile' not in options[:-1]:
+        run_command_line(options, workers, book)
+        return
+    option_index = options.index('--profile')
+    profile_path = options[option_index + 1]
+    del options[option_index:option_index + 2]
+    start_time = time.perf_counter()
+    start_profiling()
+    try:
+        run_command_line(options, workers, book)
+    finally:            # report is also written when mode exits with sys.exit
+        stop_profiling()
+        write_profile_report(profile_report(time.perf_counter() - start_time), profile_path)
+
+def run_command_line(options, workers, book):       # runs mode chosen by options left after --workers, --book and --profile
+    if options == ['--benchmark']:
+        benchmark_move_records()
+        benchmark_evaluation()
+        benchmark_captures()
+        return
+    if options == ['--uci']:
+        uci_loop(book=book)
+        return
+    if options[:1] == ['--build-book'] and len(options) >= 3:
+        executor = worker_pool(workers) if workers > 1 else None
+        print('%d book entries written to %s' % (build_book(options[2:], options[1], executor=executor), options[1]))
+        if executor != None: executor.shutdown()
+        return
+    if options[:1] == ['--perft'] and len(options) <= 2:
+        passed = run_perft_suite(int(options[1]) if len(options) == 2 else 3, workers)
+        sys.exit(0 if passed else 1)
+    if options[:1] == ['--divide'] and len(options) >= 2 and options[1].isdigit() and int(options[1]) >= 1:
+        moves = options[2:]
+        game = Game(moves.pop(0) if moves != [] and '/' in moves[0] else None)
+        for move in moves:
+            game.push(move)
+        executor = worker_pool(workers) if workers > 1 else None
+        root_nodes = parallel_divide(game, int(options[1]), executor)
+        if executor != None: executor.shutdown()
+        for move in root_nodes:
+            print('%s: %d' % (move, root_nodes[move]))
+        print('\nMoves: %d\nNodes: %d' % (len(root_nodes), sum(root_nodes.values())))
+        return
+    if options[:1] == ['--analyze'] and len(options) in (2, 3):
+        analysis_file = open(options[1])
+        positions = [line.strip() if '/' in line else line.split() for line in analysis_file]
+        analysis_file.close()
+        executor = worker_pool(workers) if workers > 1 else None
+        for line_number, analysis in enumerate(analyze_positions(positions, int(options[2]) if len(options) == 3 else 0, executor), 1):
+            print('%d: %s' % (line_number, ', '.join('%s %s' % (key, value) for key, value in analysis.items())))
+        if executor != None: executor.shutdown()
+        return
+    if options[:1] == ['--pgn'] and len(options) in (2, 3, 4):
+        pgn_reader = PgnReader(options[1])
+        first = int(options[2]) if len(options) >= 3 else 1
+        last = int(options[3]) if len(options) == 4 else (first if len(options) == 3 else len(pgn_reader))
+        errors = 0
+        for game_number in range(first - 1, min(last, len(pgn_reader))):
+            try:
+                game, tags = pgn_game(pgn_reader.game_text(game_number))
+            except ValueError as error:     # reports game and goes on to next one
+                print('%s#%d: ERROR %s' % (options[1], game_number + 1, error), file=sys.stderr)
+                errors += 1
+                continue
+            print(game.pgn(dict({'Date': '????.??.??'}, **tags)), end='')       # unknown date of PGN standard, not today's, when game has no Date tag
+        pgn_reader.close()
+        sys.exit(0 if errors == 0 else 1)
+    if options[:1] == ['--replay'] and len(options) >= 2:
+        executor = worker_pool(workers) if workers > 1 else None
+        games = 0
+        errors = 0
+        for report in replay_logs(options[1:], executor):
+            games += 1
+            if report['error'] != None: errors += 1
+            print('%s: %d moves, %s, %s%s' % (report['source'], report['moves'], report['result'], report['position'],
+                                             '' if report['error'] == None else ', ERROR ' + report['error']))
+        if executor != None: executor.shutdown()
+        print('%d games replayed, %d with illegal moves' % (games, errors))
+        sys.exit(0 if errors == 0 else 1)
+    if options != []:
+        print(command_line_usage)
+        sys.exit(2)
+    mode = ''
+    while mode != 'x':  # x = terminate the program
         print('''
+To start a new game, type n. To play against the computer, type c. To restore a game, type r.
+For game instructions, type i. To exit, type x.''')
+        mode = input()
+        if mode == 'i':     # show instructions
+            print(instructions)
+        elif mode == 'r':   # restore game
+            print('''
 Enter the name of the log file you would like to load.
-(Enter filename only, not path.)''')
-        filename = input()
-        if not filename.endswith('.txt'): filename += '.txt'
-        file_path = os.path.join('.', 'chess_log_files', filename)
-        if os.path.isfile(file_path):
-            print('Type m to manually review each move. Press enter to load final position.')   # choose restoration mode
-            if input() == 'm': silent_mode = False  # continue updating display
-            else: silent_mode = True                # do not update display until final position is reached
-            play_game(file_path, silent_mode)
-        else:
-            print('That is not a valid filename.')
-    elif mode == 'n':   # start new game
-        silent_mode = False
-        play_game('', silent_mode)
-    elif mode != 'x':   # x = terminate the program
-        print('That is not a valid choice.')
+(Enter filename only, not path. PGN files must end with .pgn.)''')
+            filename = input()
+            if not filename.endswith(('.txt', '.pgn')): filename += '.txt'
+            file_path = os.path.join('.', 'chess_log_files', filename)
+            if os.path.isfile(file_path):
+                print('Type m to manually review each move. Press enter to load final position.')   # choose restoration mode
+                if input() == 'm': silent_mode = False  # continue updating display
+                else: silent_mode = True                # do not update display until final position is reached
+                play_game(file_path, silent_mode)
+            else:
+                print('That is not a valid filename.')
+        elif mode == 'n':   # start new game
+            silent_mode = False
+            play_game('', silent_mode)
+        elif mode == 'c':   # start new game against computer
+            print('Type w to play white or b to play black.')
+            player_color = input()
+            print('Enter the number of seconds the computer may think about each move. (Press enter for 5.)')
+            move_time = input()
+            if player_color not in ('w', 'b') or not (move_time == '' or move_time.replace('.', '', 1).isdigit()):
+                print('That is not a valid choice.')
+            else:
+                play_game('', False, '-' if player_color == 'w' else '*', float(move_time or 5), book)
+        elif mode != 'x':   # x = terminate the program
+            print('That is not a valid choice.')
+
+if __name__ == '__main__':
+    main()
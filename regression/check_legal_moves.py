@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+# regression check of legal move generation: replays each game saved in games.txt and compares legal_moves_func at every ply with legal_moves.txt
+# usage: python3 regression/check_legal_moves.py        exit status is 1 if any ply differs
+
+import os
+import sys
+
+regression_folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(regression_folder))
+
+import cmd_line_chess
+
+# {(game number, ply): set of moves as piece code, start square and target square, e.g. 'Nb1c3'}
+def expected_legal_moves(path):
+    expected = {}
+    with open(path) as expected_file:
+        for line in expected_file:
+            if line.startswith('#'): continue
+            fields = line.split()
+            expected[(int(fields[0]), int(fields[1]))] = set(fields[2:])
+    return expected
+
+# legal moves of side to move in same form as expected_legal_moves; calls: legal_moves_func, square_name
+def legal_move_set(game):
+    legal_moves = cmd_line_chess.legal_moves_func(game.board, game.turn(), game.position, game.move_log)
+    return set(piece_code + cmd_line_chess.square_name(location) + cmd_line_chess.square_name(move)
+               for piece_code in legal_moves for location in legal_moves[piece_code] for move in legal_moves[piece_code][location])
+
+# compares legal moves at every ply of every game and prints first difference in each game; returns (games that differ, plies that match)
+# calls: log_games, log_lines, Game, legal_move_set
+def check_games(games_path, expected):
+    failed_games = 0
+    matched_plies = 0
+    for game_number, (source, moves) in enumerate(cmd_line_chess.log_games(cmd_line_chess.log_lines([games_path])), 1):
+        game = cmd_line_chess.Game()
+        for ply in range(len(moves) + 1):
+            legal_moves = legal_move_set(game)
+            expected_moves = expected.get((game_number, ply))
+            if legal_moves != expected_moves:
+                print('%s, ply %d: missing %s, extra %s' % (source, ply, ' '.join(sorted((expected_moves or set()) - legal_moves)) or '-',
+                                                           ' '.join(sorted(legal_moves - (expected_moves or set()))) or '-'))
+                failed_games += 1
+                break
+            matched_plies += 1
+            if ply < len(moves): game.push(moves[ply])
+    return (failed_games, matched_plies)
+
+if __name__ == '__main__':
+    expected = expected_legal_moves(os.path.join(regression_folder, 'legal_moves.txt'))
+    failed_games, matched_plies = check_games(os.path.join(regression_folder, 'games.txt'), expected)
+    print('%d of %d plies match, %d games with different legal moves' % (matched_plies, len(expected), failed_games))
+    sys.exit(0 if failed_games == 0 and matched_plies == len(expected) else 1)